@@ -0,0 +1,39 @@
+"""Build hooks; the project metadata lives in pyproject.toml."""
+
+import importlib.util
+from pathlib import Path
+
+from setuptools import setup
+from setuptools.command.build_py import build_py
+
+SRC = Path(__file__).parent / "src" / "winelocale"
+
+
+def loadBuildModule(name):
+    "Imports a module from src/winelocale without importing the package."
+    spec = importlib.util.spec_from_file_location(
+        "winelocale_build_" + name, SRC / (name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class BuildPy(build_py):
+    """Also compiles the i18n/*.lang files into i18n/catalog.bin,
+    precomputes the font metric table into metrics.bin and copies LICENSE
+    into the package for the About dialog."""
+    def run(self):
+        super().run()
+        package = Path(self.build_lib) / "winelocale"
+        catalog = loadBuildModule("catalog")
+        target = package / "i18n"
+        target.mkdir(parents=True, exist_ok=True)
+        (target / catalog.CATALOG_FILENAME).write_bytes(
+            catalog.compileCatalog(catalog.sourceLangFiles(SRC / "i18n")))
+        metrics = loadBuildModule("metrics")
+        (package / metrics.METRICS_FILENAME).write_bytes(metrics.tableBytes())
+        (package / "LICENSE").write_bytes(
+            (SRC.parent.parent / "LICENSE").read_bytes())
+
+
+setup(cmdclass={"build_py": BuildPy})
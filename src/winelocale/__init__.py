@@ -0,0 +1,5 @@
+from winelocale.winelocale import (Config, LaunchResult, LaunchSpec,
+                                   PreparedLaunch, launch, prepare)
+
+__all__ = ["Config", "LaunchResult", "LaunchSpec", "PreparedLaunch",
+           "launch", "prepare"]
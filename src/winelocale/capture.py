@@ -0,0 +1,133 @@
+'''
+-------------------------------------------------------------------------------
+Bounded capture of Wine output
+
+With debug channels enabled Wine can print gigabytes. Output of the child is
+read through a fixed-size ring buffer, so only the tail is ever kept in
+memory. Optionally everything is also written to a gzip spill file, which
+stops growing once its limit is reached.
+-------------------------------------------------------------------------------
+'''
+
+import gzip
+import os
+import subprocess
+
+# Default tail kept in memory and default uncompressed spill file limit
+CAPTURE_SIZE = 4 * 1024 * 1024
+SPILL_LIMIT = 512 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+def normalizeChannels(channels):
+    """Builds a WINEDEBUG value from a comma separated channel list.
+
+Bare channel names are enabled, so "font,reg" becomes "+font,+reg".
+Entries already carrying a +/- (e.g. "-all", "warn+heap") are kept."""
+    result = []
+    for channel in channels.split(","):
+        channel = channel.strip()
+        if not channel:
+            continue
+        if "+" not in channel and "-" not in channel:
+            channel = "+" + channel
+        result.append(channel)
+    return ",".join(result)
+
+
+class RingBuffer:
+    "Keeps the last `size` bytes written to it."
+    def __init__(self, size=CAPTURE_SIZE):
+        if size <= 0:
+            raise ValueError("ring buffer size must be positive")
+        self.size = size
+        self.buffer = bytearray(size)
+        self.position = 0
+        self.total = 0
+
+    def write(self, data):
+        data = memoryview(data)
+        if len(data) >= self.size:
+            self.buffer[:] = data[-self.size:]
+            self.position = 0
+        else:
+            head = min(len(data), self.size - self.position)
+            self.buffer[self.position:self.position + head] = data[:head]
+            rest = len(data) - head
+            self.buffer[:rest] = data[head:]
+            self.position = (self.position + len(data)) % self.size
+        self.total += len(data)
+
+    @property
+    def dropped(self):
+        "Number of bytes that fell out of the buffer."
+        return max(0, self.total - self.size)
+
+    def getvalue(self):
+        "Returns the buffered tail, oldest byte first."
+        if self.total < self.size:
+            return bytes(self.buffer[:self.position])
+        return bytes(self.buffer[self.position:] + self.buffer[:self.position])
+
+
+class SpillFile:
+    "Gzip file that accepts at most `limit` uncompressed bytes."
+    def __init__(self, path, limit=SPILL_LIMIT):
+        self.path = path
+        self.limit = limit
+        self.written = 0
+        self.truncated = False
+        self.file = gzip.open(path, "wb", compresslevel=1)
+
+    def write(self, data):
+        if self.truncated:
+            return
+        room = self.limit - self.written
+        if len(data) > room:
+            data = data[:room]
+            self.truncated = True
+        self.file.write(data)
+        self.written += len(data)
+        if self.truncated:
+            self.file.write(b"\n[winelocale: spill limit reached, "
+                            b"output truncated]\n")
+
+    def close(self):
+        self.file.close()
+
+
+def runCaptured(args, env, size=CAPTURE_SIZE, spillPath=None,
+                spillLimit=SPILL_LIMIT):
+    """Runs args, capturing stdout and stderr into a RingBuffer.
+
+Returns (returncode, ring)."""
+    ring = RingBuffer(size)
+    spill = SpillFile(spillPath, spillLimit) if spillPath else None
+    try:
+        proc = subprocess.Popen(args, env=env, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        try:
+            fd = proc.stdout.fileno()
+            while True:
+                data = os.read(fd, READ_SIZE)
+                if not data:
+                    break
+                ring.write(data)
+                if spill is not None:
+                    spill.write(data)
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+    finally:
+        if spill is not None:
+            spill.close()
+    return returncode, ring
+
+
+def saveTail(ring, path):
+    "Writes the captured tail to path, noting how much was dropped."
+    with open(path, "wb") as tail:
+        if ring.dropped:
+            tail.write(b"[winelocale: %d earlier bytes dropped]\n"
+                       % ring.dropped)
+        tail.write(ring.getvalue())
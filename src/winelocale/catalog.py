@@ -0,0 +1,141 @@
+'''
+-------------------------------------------------------------------------------
+Compiled translation catalogs
+
+The i18n/*.lang files are compiled into a single i18n/catalog.bin when the
+package is built (see setup.py). The catalog maps each language to its
+sections, and every section is stored pre-marshalled so that it is only
+decoded the first time one of its strings is asked for. One file read
+serves every language, so falling back to en_US costs no extra lookups.
+
+In a source checkout without a catalog the .lang files are compiled in
+memory on first use instead.
+-------------------------------------------------------------------------------
+'''
+
+import configparser
+import marshal
+import sys
+import threading
+import importlib.resources as resources
+
+DEFAULT_LANG_CODE = "en_US"
+CATALOG_FILENAME = "catalog.bin"
+# Oldest marshal format holding everything we store, readable by any Python
+MARSHAL_VERSION = 2
+
+_catalog = None
+_strings = {}
+_lock = threading.Lock()
+
+
+def compileLang(text):
+    "Returns {section: {option: value}} for the text of a .lang file."
+    parser = configparser.RawConfigParser()
+    parser.read_string(text)
+    return {section: dict(parser.items(section))
+            for section in parser.sections()}
+
+
+def compileCatalog(langFiles):
+    """Builds catalog bytes from an iterable of (langCode, text) pairs."""
+    catalog = {}
+    for langCode, text in langFiles:
+        catalog[langCode] = {
+            section: marshal.dumps(options, MARSHAL_VERSION)
+            for section, options in compileLang(text).items()}
+    return marshal.dumps(catalog, MARSHAL_VERSION)
+
+
+def sourceLangFiles(i18nDir):
+    "Yields (langCode, text) for every .lang file in a directory."
+    for entry in sorted(i18nDir.iterdir(), key=lambda entry: entry.name):
+        if entry.name.endswith(".lang"):
+            yield entry.name[:-len(".lang")], \
+                entry.read_text(encoding="utf-8")
+
+
+def loadCatalog():
+    "Returns the catalog, reading or compiling it on first use."
+    global _catalog
+    if _catalog is None:
+        i18nDir = resources.files("winelocale") / "i18n"
+        try:
+            _catalog = marshal.loads(
+                (i18nDir / CATALOG_FILENAME).read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            _catalog = marshal.loads(compileCatalog(sourceLangFiles(i18nDir)))
+    return _catalog
+
+
+class Strings:
+    """The strings of one language.
+
+Sections are decoded on first access. Strings missing from a translation
+are taken from en_US."""
+    def __init__(self, langCode, sections, fallback=None):
+        self.langCode = langCode
+        self.encoded = sections
+        self.decoded = {}
+        self.fallback = fallback
+
+    def section(self, section):
+        "Returns {option: value} for a section, decoding it if needed."
+        options = self.decoded.get(section)
+        if options is None:
+            encoded = self.encoded.get(section)
+            options = marshal.loads(encoded) if encoded is not None else {}
+            self.decoded[section] = options
+        return options
+
+    def get(self, section, option):
+        "Returns a translated string, like ConfigParser.get()."
+        try:
+            return self.section(section)[option]
+        except KeyError:
+            if self.fallback is not None:
+                return self.fallback.get(section, option)
+            raise KeyError(f"no string {section}.{option}") from None
+
+    def has_option(self, section, option):
+        if option in self.section(section):
+            return True
+        return self.fallback is not None and \
+            self.fallback.has_option(section, option)
+
+
+def resolveLangCode(langCode, catalog):
+    """Returns the catalog language for langCode, or None.
+
+"pt_BR.UTF-8" matches pt_BR, and "es_AR" falls back to the generic es."""
+    for candidate in (langCode, langCode[0:5], langCode[0:2]):
+        if candidate in catalog:
+            return candidate
+    return None
+
+
+def loadStrings(langCode):
+    "Returns the Strings for langCode, falling back to en_US."
+    with _lock:
+        strings = _strings.get(langCode)
+        if strings is not None:
+            return strings
+        catalog = loadCatalog()
+        resolved = resolveLangCode(langCode, catalog)
+        if resolved is None:
+            print(f"Unable to find a language file for {langCode}"
+                  ", using en_US", file=sys.stderr)
+            resolved = DEFAULT_LANG_CODE
+        strings = _strings.get(resolved)
+        if strings is None:
+            fallback = None
+            if resolved != DEFAULT_LANG_CODE:
+                fallback = _strings.get(DEFAULT_LANG_CODE)
+                if fallback is None:
+                    fallback = Strings(DEFAULT_LANG_CODE,
+                                       catalog[DEFAULT_LANG_CODE])
+                    _strings[DEFAULT_LANG_CODE] = fallback
+            strings = Strings(resolved, catalog[resolved], fallback)
+            _strings[resolved] = strings
+        _strings[langCode] = strings
+        return strings
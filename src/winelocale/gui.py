@@ -0,0 +1,433 @@
+'''
+-------------------------------------------------------------------------------
+Gtk front end
+
+Kept apart from the launch code so that importing winelocale never pulls in
+Gtk; this module is only imported when the window is actually shown.
+-------------------------------------------------------------------------------
+'''
+
+import os
+import sys
+import atexit
+import contextlib
+import functools
+import pango
+import gi
+from pathlib import Path
+from gnome import url_show
+import importlib.resources as resources
+
+from winelocale import history
+from winelocale.winelocale import (COPY, FF_SWISS, ICON_FILENAME, LICENSE,
+                                   LICENSE_FILENAME, PANGO_SCALE, PROGRAM,
+                                   VARIABLE_PITCH, VERSION, WEBSITE,
+                                   getBinaryLogFont, getLocaleList,
+                                   getStrings, recordLaunch, shellwine)
+
+gi.require_version('Gtk', '4.0')
+gi.require_version('GdkPixbuf', '2.0')
+from gi.repository import GdkPixbuf, GLib, Gtk
+
+ICON_FILE_PATH = resources.files('winelocale') / 'icons' / ICON_FILENAME
+# Copied into the package at build time, see setup.py
+LICENSE_FILE_PATH = resources.files('winelocale') / LICENSE_FILENAME
+
+'''
+-------------------------------------------------------------------------------
+Shared resources
+
+Loaded once on first use and kept for the life of the process, instead of
+being looked up again by every window and dialog.
+-------------------------------------------------------------------------------
+'''
+_resources = contextlib.ExitStack()
+atexit.register(_resources.close)
+
+
+@functools.lru_cache(maxsize=None)
+def getIconFile():
+    "Returns a filesystem path of the icon, extracting it only once."
+    return _resources.enter_context(resources.as_file(ICON_FILE_PATH))
+
+
+@functools.lru_cache(maxsize=None)
+def getIconPixbuf():
+    "Returns the icon as a pixbuf shared by every window and dialog."
+    return GdkPixbuf.Pixbuf.new_from_file(str(getIconFile()))
+
+
+@functools.lru_cache(maxsize=None)
+def getLicenseText():
+    "Returns the text shown on the license page of the About dialog."
+    try:
+        return LICENSE_FILE_PATH.read_text(encoding="utf-8")
+    except OSError as e:
+        # e.g. running from a source checkout that was never built
+        print("Unable to read the license:", e, file=sys.stderr)
+        return f"{PROGRAM} is released under the {LICENSE} License, " \
+            f"see {WEBSITE}"
+
+
+class WineLocaleWindow(Gtk.Window):
+    "Contains the GUI and all necessary function hooks."
+    def __init__(self, appConfig, timer=None):
+        self.appConfig = appConfig
+        self.timer = timer if timer is not None else history.PhaseTimer()
+        self.strings = getStrings()
+
+        super().__init__(title=PROGRAM)
+
+        self.set_size_request(400, -1)
+
+        self.set_default_icon(getIconPixbuf())
+
+        # Built the first time they are needed
+        self.aboutDialog = None
+        self.errorDialogs = {}
+        self.optionRows = None
+        self.chksmoothing = None
+        self.chk120dpi = None
+        self.chkshortcut = None
+
+        # Container element
+        self.box = Gtk.Box(Gtk.Orientation.VERTICAL, spacing=8)
+        self.add(self.box)
+
+        # Row 1
+        row1 = Gtk.Box(Gtk.Orientation.VERTICAL)
+        lblinstruct1 = Gtk.Label(self.strings.get("gui", "lblinstruct1"))
+        lblinstruct1.set_alignment(0, 0)
+        row1.pack_start(lblinstruct1, False, False)
+        row1opts = Gtk.Box(Gtk.Orientation.HORIZONTAL, spacing=5)
+        self.txtfile = Gtk.Entry()
+        row1opts.pack_start(self.txtfile, True, True)
+        self.btnfile = Gtk.FileChooserButton("Open",
+                                             Gtk.FileChooserAction.OPEN)
+        self.btnfile.set_size_request(90, -1)
+        self.btnfile.set_label(self.strings.get("gui", "btnfile"))
+        row1opts.pack_start(self.btnfile, False, False)
+        row1.pack_start(row1opts, False, False)
+        self.box.pack_start(row1, False, False)
+
+        # Row 2
+        row2 = Gtk.Box(Gtk.Orientation.VERTICAL)
+        lblinstruct2 = Gtk.Label(self.strings.get("gui", "lblinstruct2"))
+        lblinstruct2.set_alignment(0, 0)
+        row2.pack_start(lblinstruct2, False, False)
+        self.cmblocales = Gtk.combo_box_new_text()
+        row2.pack_start(self.cmblocales, False, False)
+        self.box.pack_start(row2, False, False)
+
+        # Row 3, filled in when first expanded
+        self.expander = Gtk.Expander(self.strings.get("gui", "expander"))
+        self.box.pack_start(self.expander, True, True)
+        self.expander.connect("activate", self.buildOptions)
+        self.expander.connect("activate", self.resize)
+
+        # Row 4
+        row4 = Gtk.Box(Gtk.Orientation.HORIZONTAL, spacing=5)
+        self.btnhelp = Gtk.Button("Help", Gtk.STOCK_HELP)
+        self.btnhelp.set_label(self.strings.get("gui", "btnhelp"))
+        self.btnhelp.set_size_request(90, -1)
+        row4.pack_start(self.btnhelp, False, False)
+        row4.pack_start(Gtk.Label(""), True, True)
+        self.btnclose = Gtk.Button("Close", Gtk.STOCK_CLOSE)
+        self.btnclose.set_label(self.strings.get("gui", "btnclose"))
+        self.btnclose.set_size_request(90, -1)
+        row4.pack_start(self.btnclose, False, False)
+        self.btnexecute = Gtk.Button("Execute", Gtk.STOCK_EXECUTE)
+        self.btnexecute.set_label(self.strings.get("gui", "btnexecute"))
+        self.btnexecute.set_size_request(90, -1)
+        row4.pack_start(self.btnexecute, False, False)
+        self.box.pack_start(row4, False, False)
+
+        # Check which fonts exist
+        context = self.txtfile.get_pango_context()
+        with self.timer.phase("fonts"):
+            set_fonts(context.list_families(), appConfig)
+
+        # Store our current Gtk font info to a LOGFONT
+        set_logfont_from_gtk(context.get_font_description(), appConfig)
+
+        # Populate the locales drop-down
+        self.localeList = getLocaleList(appConfig)
+        for langTitle, langEnv, langCode in self.localeList:
+            self.cmblocales.append_text(langTitle)
+        self.cmblocales.set_active(0)
+
+        # Fix the expander to suit work area
+        self.expanded = False
+        self.flatsize = None
+        self.expasize = None
+
+        # Events
+        self.btnfile.connect("clicked", self.open)
+        self.btnclose.connect("clicked", self.destroy)
+        self.btnhelp.connect("clicked", self.about)
+        self.btnexecute.connect("clicked", self.execute)
+        getBinaryLogFont(appConfig.locale, appConfig.logFont)
+
+        # Stock images are only needed once the window is up, and the
+        # first frame is what we measure startup against
+        self.connect("realize", self.watchFirstFrame)
+
+        # Update settings
+        for i in range(0, len(self.localeList)):
+            if self.localeList[i][2] == appConfig.locale:
+                self.cmblocales.set_active(i)
+
+        if not isinstance(appConfig.programPath, type(None)):
+            self.txtfile.set_text(appConfig.programPath)
+            self.set_focus(self.btnexecute)
+
+        return
+
+    '''
+    void watchFirstFrame()
+
+    Records the time to the first painted frame in the launch timings, then
+    adds the stock images to the buttons.
+    '''
+    def watchFirstFrame(self, widget):
+        frameClock = self.get_frame_clock()
+        handler = None
+
+        def afterPaint(clock):
+            clock.disconnect(handler)
+            self.timer.mark("firstframe")
+            GLib.idle_add(self.addStockImages)
+        handler = frameClock.connect("after-paint", afterPaint)
+
+    '''
+    bool addStockImages()
+
+    Decorates the buttons with their stock images.
+    '''
+    def addStockImages(self):
+        for button, stock in ((self.btnfile, Gtk.STOCK_OPEN),
+                              (self.btnhelp, Gtk.STOCK_HELP),
+                              (self.btnclose, Gtk.STOCK_CLOSE),
+                              (self.btnexecute, Gtk.STOCK_EXECUTE)):
+            button.set_image(Gtk.Image.new_from_stock(stock,
+                                                      Gtk.IconSize.MENU))
+        return False
+
+    '''
+    void buildOptions()
+
+    Fills the expander with the extended options the first time it opens.
+    '''
+    def buildOptions(self, widget):
+        if self.optionRows is not None:
+            return
+        self.optionRows = Gtk.Box(Gtk.Orientation.VERTICAL)
+        self.chksmoothing = Gtk.CheckButton(
+            self.strings.get("gui", "chksmoothing"))
+        self.optionRows.pack_start(self.chksmoothing, False, False)
+        self.chk120dpi = Gtk.CheckButton(self.strings.get("gui", "chk120dpi"))
+        self.optionRows.pack_start(self.chk120dpi, False, False)
+        self.chkshortcut = Gtk.CheckButton(
+            self.strings.get("gui", "chkshortcut"))
+        self.optionRows.pack_start(self.chkshortcut, False, False)
+        self.expander.add(self.optionRows)
+
+        # Update settings
+        if self.appConfig.useShortcut:
+            self.chkshortcut.set_active(True)
+        if self.appConfig.useSmoothing:
+            self.chksmoothing.set_active(True)
+        if self.appConfig.useHiDpiFont:
+            self.chk120dpi.set_active(True)
+        self.optionRows.show_all()
+
+    '''
+    void resize()
+
+    Fix the expander to suit our work area.
+    '''
+    def resize(self, widget):
+        if isinstance(self.expasize, type(None)) and \
+           isinstance(self.flatsize, type(None)):
+            self.flatsize = self.window.get_size()
+        elif isinstance(self.expasize, type(None)):
+            self.expasize = self.window.get_size()
+        if not self.expanded and not isinstance(self.expasize, type(None)):
+            self.window.set_size_request(self.expasize[0], self.expasize[1])
+            self.window.resize(self.expasize[0], self.expasize[1])
+            self.expanded = True
+        elif self.expanded and not isinstance(self.flatsize, type(None)):
+            self.window.set_size_request(self.flatsize[0], self.flatsize[1])
+            self.window.resize(self.flatsize[0], self.flatsize[1])
+            self.expanded = False
+        elif not self.expanded:
+            self.expanded = True
+
+    '''
+    void open()
+
+    Opens file dialog and sets self.txtfile to the selected file.
+    '''
+    def open(self, widget, file_name=""):
+        buttons = (Gtk.STOCK_CANCEL, Gtk.RESPONSE_CANCEL,
+                   Gtk.STOCK_OPEN, Gtk.RESPONSE_OK)
+        dialog = Gtk.FileChooserDialog(self.strings.get("file", "title"),
+                                       None, Gtk.FILE_CHOOSER_ACTION_OPEN,
+                                       buttons)
+        # Add filters
+        filter = Gtk.FileFilter()
+        filter.set_name(self.strings.get("file", "exefilter"))
+        filter.add_pattern("*.exe")
+        filter.add_pattern("*.EXE")
+        dialog.add_filter(filter)
+        filter = Gtk.FileFilter()
+        filter.set_name(self.strings.get("file", "allfilter"))
+        filter.add_pattern("*")
+        dialog.add_filter(filter)
+        if dialog.run() == Gtk.RESPONSE_OK:
+            self.txtfile.set_text(dialog.get_filename())
+        dialog.destroy()
+
+    '''
+    void click_website()
+
+    Shells open the default browser to the WineLocale page.
+    '''
+    def click_website(self, dialog, link, data=None):
+        url_show(link)
+
+    '''
+    void about()
+
+    Display the Gtk About dialog, creating it on first use.
+    '''
+    def about(self, widget):
+        if self.aboutDialog is None:
+            Gtk.about_dialog_set_url_hook(self.click_website)
+
+            dialog = Gtk.AboutDialog()
+            dialog.set_icon(getIconPixbuf())
+            dialog.set_name(PROGRAM)
+            dialog.set_version(VERSION)
+            dialog.set_comments(self.strings.get("about", "comments"))
+            dialog.set_copyright(COPY)
+            dialog.set_license(getLicenseText())
+            dialog.set_logo(getIconPixbuf())
+            dialog.set_website(WEBSITE)
+            self.aboutDialog = dialog
+        self.aboutDialog.run()
+        self.aboutDialog.hide()
+
+    '''
+    void error()
+
+    Display an error dialog made of two strings from the dialogs section,
+    creating it on first use. A detail, such as an exception message, takes
+    the place of the second string.
+    '''
+    def error(self, first, second, detail=None):
+        dialog = self.errorDialogs.get((first, second, detail))
+        if dialog is None:
+            message = self.strings.get("dialogs", first) + "\n\n" + \
+                (detail if detail is not None
+                 else self.strings.get("dialogs", second))
+            dialog = Gtk.MessageDialog(None, Gtk.DIALOG_MODAL,
+                                       Gtk.MESSAGE_INFO, Gtk.BUTTONS_OK,
+                                       message)
+            dialog.set_title(self.strings.get("dialogs", "errortitle"))
+            dialog.set_icon(getIconPixbuf())
+            self.errorDialogs[(first, second, detail)] = dialog
+        dialog.run()
+        dialog.hide()
+
+    '''
+    void execute()
+
+    Test if everything is set that needs to be for execution. commit all
+    settings to the local config file.
+
+    LOADING READY RUN!
+    '''
+    def execute(self, widget):
+        # Should we even be doing this?
+        if(self.txtfile.get_text() == ""):
+            self.error("noexe1", "noexe2")
+            return(0)
+
+        elif not os.path.exists(self.txtfile.get_text()):
+            self.error("exenotfound1", "exenotfound2")
+            return(0)
+
+        elif self.cmblocales.get_active() < 0:
+            self.error("nolocale1", "nolocale2")
+            return(0)
+
+        self.hide()
+
+        # Update settings; unless the options were opened, keep them as is
+        if self.optionRows is not None:
+            self.appConfig.useShortcut = self.chkshortcut.get_active()
+            self.appConfig.useSmoothing = self.chksmoothing.get_active()
+            self.appConfig.useHiDpiFont = self.chk120dpi.get_active()
+        self.appConfig.locale = \
+            self.localeList[self.cmblocales.get_active()][2]
+        self.appConfig.programPath = Path(self.txtfile.get_text())
+        self.appConfig.updateConfigFile()
+        try:
+            returncode = shellwine(self.appConfig, self.timer)
+        except (OSError, ValueError) as e:
+            self.show()
+            self.error("launchfailed", None, str(e))
+            return(0)
+        recordLaunch(self.appConfig, self.timer, returncode)
+
+        Gtk.main_quit()
+
+    '''
+    void delete()
+
+    Hook to quit the GUI.
+    '''
+    def delete(self, widget, event):
+        return False
+
+
+def set_fonts(fonts, appConfig):
+    "Updates appConfig haveFonts with present system fonts."
+    for font in fonts:
+        if font.get_name() == 'UnBatang':
+            appConfig.haveFonts["UnBatang"] = True
+        elif font.get_name() == 'UnDotum':
+            appConfig.haveFonts["UnDotum"] = True
+        elif font.get_name() == 'AR PL UMing TW':
+            appConfig.haveFonts["AR PL UMing TW"] = True
+        elif font.get_name() == 'AR PL UMing CN':
+            appConfig.haveFonts["AR PL UMing CN"] = True
+        elif font.get_name() == 'Kochi Gothic':
+            appConfig.haveFonts["Kochi Gothic"] = True
+        elif font.get_name() == 'Kochi Mincho':
+            appConfig.haveFonts["Kochi Mincho"] = True
+
+
+def set_logfont_from_gtk(pangofont, appConfig):
+    "Populates the appconfig.logFont using data from Gtk."
+    lfItalic = appConfig.logFont.lfItalic
+    if pangofont.get_style() & pango.STYLE_ITALIC or pangofont.get_style() & \
+       pango.STYLE_OBLIQUE:
+        lfItalic = 1
+    # variable seems unused
+    # WINE_MENUBAR = GTKTABLE_96[pangofont.get_size() / PANGO_SCALE][1]
+    appConfig.logFont = appConfig.logFont.replace(
+        lfFaceName=pangofont.get_family(),
+        lfItalic=lfItalic,
+        lfWeight=pangofont.get_weight() + 0,
+        lfHeight=pangofont.get_size() / PANGO_SCALE,
+        lfPitchAndFamily=VARIABLE_PITCH ^ FF_SWISS)
+
+
+def run(appConfig, timer=None):
+    "Shows the main window and runs the Gtk main loop."
+    win = WineLocaleWindow(appConfig, timer)
+    win.connect("destroy", Gtk.main_quit)
+    win.show_all()
+    Gtk.main()
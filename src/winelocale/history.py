@@ -0,0 +1,253 @@
+'''
+-------------------------------------------------------------------------------
+Launch history
+
+Every launch is recorded in a small SQLite database together with the time
+spent in each phase (config load, font scan, patch generation, regedit and
+the program itself). The stats subcommand reads it back to report
+percentiles and to spot launches that are getting slower.
+-------------------------------------------------------------------------------
+'''
+
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS launches (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    started   REAL NOT NULL,
+    exe       TEXT NOT NULL,
+    locale    TEXT NOT NULL,
+    prefix    TEXT NOT NULL,
+    exitcode  INTEGER
+);
+CREATE TABLE IF NOT EXISTS phases (
+    launch    INTEGER NOT NULL REFERENCES launches(id) ON DELETE CASCADE,
+    name      TEXT NOT NULL,
+    seconds   REAL NOT NULL,
+    PRIMARY KEY (launch, name)
+);
+CREATE INDEX IF NOT EXISTS launches_key ON launches (exe, locale, started);
+"""
+
+# Phases in the order a launch goes through them
+PHASES = ("config", "fonts", "display", "patch", "regedit", "runtime")
+TOTAL = "total"
+# Points in time measured from startup; they overlap the phases, so they are
+# reported but left out of the total
+MILESTONES = ("firstframe",)
+
+PERCENTILES = (50, 95, 99)
+
+
+def historyPath():
+    "Returns the location of the launch history database."
+    return Path.home() / ".winelocale.sqlite"
+
+
+def getWinePrefix(env=None):
+    "Returns the Wine prefix a launch with the given environment will use."
+    env = os.environ if env is None else env
+    prefix = env.get("WINEPREFIX")
+    if prefix:
+        return str(Path(prefix).expanduser())
+    return str(Path(env.get("HOME", "~")).expanduser() / ".wine")
+
+
+def connect(path=None):
+    "Opens the history database, creating the schema on first use."
+    db = sqlite3.connect(str(path or historyPath()), timeout=5)
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(SCHEMA)
+    return db
+
+
+def recordLaunch(exe, locale, prefix, timings, exitcode, started=None,
+                 path=None):
+    "Stores one launch and its phase durations (in seconds)."
+    if started is None:
+        started = time.time()
+    db = connect(path)
+    try:
+        with db:
+            cur = db.execute("INSERT INTO launches (started, exe, locale, "
+                             "prefix, exitcode) VALUES (?, ?, ?, ?, ?)",
+                             (started, str(exe), locale, prefix, exitcode))
+            db.executemany("INSERT INTO phases (launch, name, seconds) "
+                           "VALUES (?, ?, ?)",
+                           [(cur.lastrowid, name, float(seconds))
+                            for name, seconds in timings.items()])
+    finally:
+        db.close()
+
+
+class PhaseTimer:
+    "Collects wall clock durations of the phases of a launch."
+    def __init__(self):
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def add(self, name, seconds):
+        "Adds seconds to a phase; a phase may run more than once."
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def mark(self, name):
+        "Records the time since the timer was created as a milestone."
+        self.timings[name] = time.perf_counter() - self.started
+
+    def phase(self, name):
+        "Context manager timing the enclosed block as the named phase."
+        return _Phase(self, name)
+
+
+class _Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def percentile(values, pct):
+    "Linearly interpolated percentile of a sorted list of values."
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    rank = (len(values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def loadSamples(db, exe=None, locale=None):
+    """Returns {(exe, locale): {phase: [seconds, ...]}} in launch order.
+
+The synthetic phase "total" is the sum of all phases of a launch, not
+counting milestones."""
+    query = "SELECT l.id, l.exe, l.locale, p.name, p.seconds " \
+            "FROM launches l JOIN phases p ON p.launch = l.id"
+    where = []
+    params = []
+    if exe is not None:
+        where.append("l.exe = ?")
+        params.append(str(exe))
+    if locale is not None:
+        where.append("l.locale = ?")
+        params.append(locale)
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY l.started, l.id"
+
+    samples = {}
+    totals = {}
+    for launchId, launchExe, launchLocale, name, seconds in \
+            db.execute(query, params):
+        key = (launchExe, launchLocale)
+        samples.setdefault(key, {}).setdefault(name, []).append(seconds)
+        launches = totals.setdefault(key, {})
+        if name in MILESTONES:
+            launches.setdefault(launchId, 0.0)
+            continue
+        launches[launchId] = launches.get(launchId, 0.0) + seconds
+    for key, launches in totals.items():
+        samples[key][TOTAL] = list(launches.values())
+    return samples
+
+
+def findRegression(series, recent=3, window=20, threshold=1.5, minimum=5):
+    """Compares the median of the latest launches against a rolling baseline.
+
+Returns (baseline, current) when the current median exceeds the baseline
+median by more than threshold, otherwise None. recent and window must be
+at least 1."""
+    if recent < 1 or window < 1:
+        raise ValueError("recent and window must be at least 1")
+    if len(series) < recent + minimum:
+        return None
+    current = sorted(series[-recent:])
+    baseline = sorted(series[-(recent + window):-recent])
+    current = percentile(current, 50)
+    baseline = percentile(baseline, 50)
+    if baseline > 0 and current > baseline * threshold:
+        return baseline, current
+    return None
+
+
+def _phaseOrder(name):
+    if name == TOTAL:
+        return (len(PHASES) + 1, name)
+    if name in PHASES:
+        return (PHASES.index(name), name)
+    return (len(PHASES), name)
+
+
+def formatReport(samples, recent=3, window=20, threshold=1.5):
+    "Renders percentile and regression lines for the loaded samples."
+    lines = []
+    header = "%-10s %6s" % ("phase", "runs") + \
+        "".join(" %9s" % ("p%d" % p) for p in PERCENTILES)
+    for (exe, locale) in sorted(samples):
+        phases = samples[(exe, locale)]
+        lines.append("%s [%s]" % (exe, locale))
+        lines.append("  " + header)
+        flagged = []
+        for name in sorted(phases, key=_phaseOrder):
+            series = phases[name]
+            ordered = sorted(series)
+            lines.append("  %-10s %6d" % (name, len(series)) + "".join(
+                " %8.3fs" % percentile(ordered, p) for p in PERCENTILES))
+            regression = findRegression(series, recent, window, threshold)
+            if regression is not None:
+                flagged.append((name,) + regression)
+        for name, baseline, current in flagged:
+            lines.append("  REGRESSION %s: median of last %d runs %.3fs vs "
+                         "baseline %.3fs (x%.2f)"
+                         % (name, recent, current, baseline,
+                            current / baseline))
+        lines.append("")
+    if not lines:
+        lines.append("No launches recorded yet.")
+    return "\n".join(lines).rstrip("\n")
+
+
+def stats(argv=None):
+    "Entry point of the stats subcommand."
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="winelocale stats",
+        description="Report launch time percentiles per executable and "
+        "locale, and flag phases slower than their rolling baseline.")
+    parser.add_argument("--exe", help="only report this executable")
+    parser.add_argument("-l", "--locale", help="only report this locale")
+    parser.add_argument("--recent", type=int, default=3,
+                        help="launches compared against the baseline")
+    parser.add_argument("--window", type=int, default=20,
+                        help="launches forming the rolling baseline")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="slowdown factor reported as a regression")
+    parser.add_argument("--db", type=Path, default=None,
+                        help="history database to read")
+    args = parser.parse_args(argv)
+    if args.recent < 1 or args.window < 1:
+        parser.error("--recent and --window must be at least 1")
+    # Launches are recorded under the resolved path of the executable
+    exe = None if args.exe is None else Path(args.exe).resolve()
+
+    db = connect(args.db)
+    try:
+        samples = loadSamples(db, exe, args.locale)
+    finally:
+        db.close()
+    print(formatReport(samples, args.recent, args.window, args.threshold))
+    return 0
@@ -0,0 +1,186 @@
+'''
+-------------------------------------------------------------------------------
+System locale availability
+
+Wine silently falls back to the C locale when LANG names a locale that was
+never generated on the host. To catch that before launching, the generated
+locales are read straight from glibc's locale-archive and the locale
+directories, the same places setlocale() looks, without running `locale -a`.
+The result is cached on disk and reused until one of those paths changes.
+-------------------------------------------------------------------------------
+'''
+
+import json
+import mmap
+import os
+import re
+import threading
+from pathlib import Path
+from struct import Struct
+
+LOCALE_DIR = Path("/usr/lib/locale")
+LOCALE_ARCHIVE = LOCALE_DIR / "locale-archive"
+
+# glibc locarchive.h: struct locarhead starts with the magic, the serial and
+# the offset, used count and size of the name hash table; every struct
+# namehashent is a hash value, a name offset and a locale record offset.
+ARCHIVE_MAGIC = 0xde020109
+ARCHIVE_HEAD = Struct("=IIIII")
+ARCHIVE_NAMEHASH = Struct("=III")
+
+_index = None
+_lock = threading.Lock()
+
+
+def normalizeLocale(name):
+    """Normalizes a locale name the way glibc does before looking it up.
+
+The codeset is lowercased with punctuation removed, so "en_US.UTF-8" and
+"en_US.utf8" are the same locale."""
+    match = re.match(r"^([^.@]*)(?:\.([^@]*))?(@.*)?$", name)
+    if match is None:
+        return name
+    language, codeset, modifier = match.groups()
+    if codeset:
+        codeset = re.sub(r"[^0-9a-z]", "", codeset.lower())
+        language += "." + codeset
+    return language + (modifier or "")
+
+
+def readLocaleArchive(path=LOCALE_ARCHIVE):
+    "Returns the names of the locales in a glibc locale-archive."
+    names = set()
+    with open(path, "rb") as archive:
+        with mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, serial, namehashOffset, namehashUsed, namehashSize = \
+                ARCHIVE_HEAD.unpack_from(data)
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"{path} is not a locale archive")
+            for slot in range(namehashSize):
+                hashValue, nameOffset, locrecOffset = \
+                    ARCHIVE_NAMEHASH.unpack_from(
+                        data, namehashOffset + slot * ARCHIVE_NAMEHASH.size)
+                if nameOffset == 0 or locrecOffset == 0:
+                    continue
+                end = data.find(b"\0", nameOffset)
+                names.add(data[nameOffset:end].decode("ascii", "replace"))
+    return names
+
+
+def readLocaleDirs(dirs):
+    "Returns the names of the locales compiled into separate directories."
+    names = set()
+    for directory in dirs:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir() and \
+               os.path.exists(os.path.join(entry.path, "LC_CTYPE")):
+                names.add(entry.name)
+    return names
+
+
+def localeSources():
+    "Returns the archive and the directories setlocale() would search."
+    dirs = [LOCALE_DIR]
+    if os.environ.get("LOCPATH"):
+        dirs = [Path(path) for path in os.environ["LOCPATH"].split(":")
+                if path] + dirs
+    return LOCALE_ARCHIVE, dirs
+
+
+def cachePath():
+    """Returns the on-disk cache of the locale index.
+
+Returns None, meaning no disk cache, when neither XDG_CACHE_HOME nor HOME
+is set, as for services started with an empty environment."""
+    cacheHome = os.environ.get("XDG_CACHE_HOME")
+    if not cacheHome:
+        home = os.environ.get("HOME")
+        if not home:
+            return None
+        cacheHome = os.path.join(home, ".cache")
+    return Path(cacheHome) / "winelocale" / "locales.json"
+
+
+def _stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamp.append([str(path), stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            stamp.append([str(path), None, None])
+    return stamp
+
+
+def scanLocales(archive, dirs):
+    "Reads every generated locale, normalized, from the archive and dirs."
+    names = set()
+    try:
+        names |= readLocaleArchive(archive)
+    except (OSError, ValueError):
+        pass
+    names |= readLocaleDirs(dirs)
+    return frozenset(normalizeLocale(name) for name in names)
+
+
+def loadIndex(cache=None):
+    """Returns the set of normalized locale names generated on this host.
+
+The index is cached in memory and, when cachePath() finds a home, on disk,
+keyed by the modification time and size of the locale archive and
+directories."""
+    global _index
+    archive, dirs = localeSources()
+    stamp = _stamp([archive] + dirs)
+    with _lock:
+        if _index is not None and _index[0] == stamp:
+            return _index[1]
+        cache = cachePath() if cache is None else cache
+        if cache is not None:
+            try:
+                cached = json.loads(cache.read_text())
+                if cached["stamp"] == stamp:
+                    _index = (stamp, frozenset(cached["locales"]))
+                    return _index[1]
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+        locales = scanLocales(archive, dirs)
+        _index = (stamp, locales)
+        if cache is None:
+            return locales
+        try:
+            cache.parent.mkdir(parents=True, exist_ok=True)
+            tempPath = cache.with_name(cache.name + ".%d" % os.getpid())
+            tempPath.write_text(json.dumps({"stamp": stamp,
+                                            "locales": sorted(locales)}))
+            os.replace(tempPath, cache)
+        except OSError:
+            pass
+        return locales
+
+
+def isLocaleAvailable(name, index=None):
+    """Checks that a locale such as "ja_JP.UTF-8" is generated on this host.
+
+When no locales can be found at all (e.g. a libc without a locale archive)
+every locale is assumed to be available."""
+    index = loadIndex() if index is None else index
+    if not index:
+        return True
+    return normalizeLocale(name) in index
+
+
+def utf8Locales(index=None):
+    "Returns the language_TERRITORY codes of every generated UTF-8 locale."
+    index = loadIndex() if index is None else index
+    codes = set()
+    for name in index:
+        match = re.match(r"^([a-z]{2,3}_[A-Z]{2})\.utf8$", name)
+        if match is not None:
+            codes.add(match.group(1))
+    return codes
@@ -0,0 +1,140 @@
+'''
+-------------------------------------------------------------------------------
+Font metric tables
+
+Pango sizes do not match up to the sizes at which Wine draws the menubar,
+so GTKTABLE_96 maps Pango point sizes to the Wine font height and menubar
+height, in pixels, measured at 96dpi. Everything else is derived from it:
+a size at another dpi is first converted to the 96dpi size with the same
+pixel size, then looked up by interpolating between the measured sizes and
+extrapolating the table's least squares line beyond them.
+
+That model is precomputed into a dense table of METRIC_STEPS steps per
+point for every supported dpi when the package is built (see setup.py), so
+a lookup is a single index into an array.
+-------------------------------------------------------------------------------
+'''
+
+import sys
+import threading
+from array import array
+import importlib.resources as resources
+
+# 96dpi table (default)
+# Hope a beta tester can help if someone needs another dpi!
+GTKTABLE_96 = {
+    6: (9, 15),
+    7: (10, 17),
+    8: (11, 18),
+    9: (13, 20),
+    10: (14, 22),
+    11: (15, 23),
+    12: (16, 24),
+    13: (18, 27),
+    14: (20, 28),
+    16: (22, 31)
+}
+
+# The LogPixels values we know how to patch, see REG_SETDPI
+SUPPORTED_DPI = (96, 120, 144, 192)
+BASE_DPI = 96
+
+# Precomputed sizes: 0 to MAX_SIZE points in 1/METRIC_STEPS point steps
+METRIC_STEPS = 8
+MAX_SIZE = 96
+METRICS_FILENAME = "metrics.bin"
+
+_sizes = sorted(GTKTABLE_96)
+_table = None
+_lock = threading.Lock()
+
+
+def _fitLine(column):
+    "Least squares line through one column of GTKTABLE_96."
+    count = len(_sizes)
+    meanX = sum(_sizes) / count
+    meanY = sum(GTKTABLE_96[size][column] for size in _sizes) / count
+    slope = sum((size - meanX) * (GTKTABLE_96[size][column] - meanY)
+                for size in _sizes) / \
+        sum((size - meanX) ** 2 for size in _sizes)
+    return slope, meanY - slope * meanX
+
+
+_lines = (_fitLine(0), _fitLine(1))
+
+
+def _modelValue(size, column):
+    if size < _sizes[0] or size > _sizes[-1]:
+        slope, intercept = _lines[column]
+        edge = _sizes[0] if size < _sizes[0] else _sizes[-1]
+        # Keep the curve continuous with the measured end of the table
+        offset = GTKTABLE_96[edge][column] - (slope * edge + intercept)
+        return slope * size + intercept + offset
+    for low, high in zip(_sizes, _sizes[1:]):
+        if low <= size <= high:
+            lowValue = GTKTABLE_96[low][column]
+            highValue = GTKTABLE_96[high][column]
+            return lowValue + (highValue - lowValue) * \
+                (size - low) / (high - low)
+    return GTKTABLE_96[size][column]
+
+
+def modelMetrics(size, dpi=BASE_DPI):
+    """Computes (font height, menubar height) in pixels for a Pango size.
+
+The model reproduces GTKTABLE_96 exactly for its sizes at 96dpi."""
+    size = float(size) * dpi / BASE_DPI
+    return tuple(max(1, int(_modelValue(size, column) + 0.5))
+                 for column in (0, 1))
+
+
+def buildTable():
+    "Returns the dense metric table as an array of unsigned shorts."
+    table = array("H")
+    for dpi in SUPPORTED_DPI:
+        for step in range(MAX_SIZE * METRIC_STEPS + 1):
+            table.extend(modelMetrics(step / METRIC_STEPS, dpi))
+    return table
+
+
+def tableBytes(table=None):
+    "Serializes a metric table as little endian unsigned shorts."
+    table = array("H", buildTable() if table is None else table)
+    if sys.byteorder != "little":
+        table.byteswap()
+    return table.tobytes()
+
+
+def loadTable():
+    "Returns the metric table, reading or computing it on first use."
+    global _table
+    with _lock:
+        if _table is None:
+            table = array("H")
+            try:
+                table.frombytes((resources.files("winelocale") /
+                                 METRICS_FILENAME).read_bytes())
+                if sys.byteorder != "little":
+                    table.byteswap()
+            except (OSError, ValueError):
+                table = array("H")
+            if len(table) != len(SUPPORTED_DPI) * \
+               (MAX_SIZE * METRIC_STEPS + 1) * 2:
+                table = buildTable()
+            _table = table
+        return _table
+
+
+def fontMetrics(size, dpi=BASE_DPI):
+    """Returns (font height, menubar height) in pixels for a Pango size.
+
+Any size works: sizes are rounded to the nearest 1/METRIC_STEPS point, and
+sizes beyond the precomputed range, or dpi values other than
+SUPPORTED_DPI, are computed from the model directly."""
+    step = int(float(size) * METRIC_STEPS + 0.5)
+    if 0 <= step <= MAX_SIZE * METRIC_STEPS and dpi in SUPPORTED_DPI:
+        table = _table if _table is not None else loadTable()
+        index = (SUPPORTED_DPI.index(dpi) *
+                 (MAX_SIZE * METRIC_STEPS + 1) + step) * 2
+        return table[index], table[index + 1]
+    return modelMetrics(step / METRIC_STEPS, dpi)
@@ -0,0 +1,184 @@
+'''
+-------------------------------------------------------------------------------
+Profiling
+
+`winelocale --profile DIR ...` runs the whole launch under cProfile and
+tracemalloc and writes, into DIR:
+
+  winelocale.pstats   cProfile statistics, for pstats or snakeviz
+  winelocale.folded   collapsed stacks for flamegraph.pl or speedscope
+  allocations.txt     the top allocation sites and the peak traced memory
+
+Time spent waiting for Wine (regedit and the program itself) is left out of
+the Python profile; it is already reported by `winelocale stats`. The
+profiler stays enabled throughout, so every frame keeps its callers; its
+clock simply stands still while winelocale waits.
+-------------------------------------------------------------------------------
+'''
+
+import cProfile
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from winelocale.history import PhaseTimer
+
+# Phases that only wait for a child process (Wine, or Xvfb starting up)
+WAIT_PHASES = ("display", "regedit", "runtime")
+TRACE_FRAMES = 25
+TOP_ALLOCATIONS = 30
+MAX_DEPTH = 128
+
+
+class PausableClock:
+    "A perf_counter() clock that stands still while paused."
+    def __init__(self):
+        self.paused = 0
+        self.pausedAt = None
+        self.offset = 0.0
+
+    def __call__(self):
+        if self.pausedAt is not None:
+            return self.pausedAt - self.offset
+        return time.perf_counter() - self.offset
+
+    def pause(self):
+        if self.paused == 0:
+            self.pausedAt = time.perf_counter()
+        self.paused += 1
+
+    def resume(self):
+        self.paused -= 1
+        if self.paused == 0:
+            self.offset += time.perf_counter() - self.pausedAt
+            self.pausedAt = None
+
+
+class Profile:
+    "cProfile and tracemalloc over one run, written to a directory."
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.clock = PausableClock()
+        self.profiler = cProfile.Profile(self.clock)
+
+    def start(self):
+        tracemalloc.start(TRACE_FRAMES)
+        self.profiler.enable()
+
+    def pause(self):
+        "Stops the profile's clock, e.g. while waiting for a child."
+        self.clock.pause()
+
+    def resume(self):
+        self.clock.resume()
+
+    def stop(self):
+        "Stops profiling and writes the results."
+        self.profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(str(self.directory / "winelocale.pstats"))
+        stats = pstats.Stats(self.profiler).stats
+        with open(self.directory / "winelocale.folded", "w") as folded:
+            for stack, micros in sorted(collapseStacks(stats).items()):
+                folded.write("%s %d\n" % (stack, micros))
+        with open(self.directory / "allocations.txt", "w") as allocations:
+            allocations.write(formatAllocations(snapshot, current, peak))
+        print("Profile written to", self.directory, file=sys.stderr)
+
+
+class ProfilingTimer(PhaseTimer):
+    "PhaseTimer pausing the profiler while waiting for Wine."
+    def __init__(self, profile):
+        super().__init__()
+        self.profile = profile
+
+    def phase(self, name):
+        if name in WAIT_PHASES:
+            return _Paused(super().phase(name), self.profile)
+        return super().phase(name)
+
+
+class _Paused:
+    def __init__(self, phase, profile):
+        self.phase = phase
+        self.profile = profile
+
+    def __enter__(self):
+        self.profile.pause()
+        return self.phase.__enter__()
+
+    def __exit__(self, *exc):
+        try:
+            return self.phase.__exit__(*exc)
+        finally:
+            self.profile.resume()
+
+
+def frameName(func):
+    "Formats a pstats function key as a flame graph frame."
+    filename, line, name = func
+    if filename == "~":
+        # Builtins are listed as ('~', 0, '<built-in method ...>')
+        return name
+    return "%s (%s:%d)" % (name, os.path.basename(filename), line)
+
+
+def collapseStacks(stats):
+    """Turns pstats data into {"root;...;leaf": microseconds}.
+
+cProfile only records caller/callee pairs, so the time of a function called
+from several places is split between its callers in proportion to the
+time each of them spent in it."""
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, callerStats in callers.items():
+            callees.setdefault(caller, {})[func] = callerStats[3]
+    roots = [func for func, entry in stats.items() if not entry[4]]
+
+    folded = {}
+
+    def walk(func, stack, share):
+        cc, nc, tt, ct, callers = stats[func]
+        stack = stack + [frameName(func)]
+        selfTime = tt * share
+        if selfTime > 0:
+            key = ";".join(stack)
+            folded[key] = folded.get(key, 0.0) + selfTime
+        if len(stack) >= MAX_DEPTH:
+            return
+        for callee, calleeTime in callees.get(func, {}).items():
+            total = stats[callee][3]
+            # Paths under a microsecond would not show up anyway
+            if total <= 0 or calleeTime * share < 1e-6 or \
+               frameName(callee) in stack:
+                continue
+            walk(callee, stack, calleeTime * share / total)
+
+    for root in roots:
+        walk(root, [], 1.0)
+    return {stack: int(seconds * 1e6) for stack, seconds in folded.items()
+            if int(seconds * 1e6) > 0}
+
+
+def formatAllocations(snapshot, current, peak):
+    "Renders the top allocation sites of a tracemalloc snapshot."
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    lines = ["Traced memory: %.1f KiB current, %.1f KiB peak"
+             % (current / 1024, peak / 1024), ""]
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        lines.append("%10.1f KiB %8d blocks  %s:%d"
+                     % (stat.size / 1024, stat.count, frame.filename,
+                        frame.lineno))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,250 @@
+'''
+-------------------------------------------------------------------------------
+Supervised launches
+
+`winelocale --supervise` patches the prefix once and then keeps the program
+running: when it crashes, only the Wine process is started again, after an
+exponentially growing delay. Restarts are limited to a budget per time
+window so a program that can no longer start is not retried forever. The
+child is watched through a pidfd where the kernel has them (Linux 5.3),
+otherwise by polling.
+
+Supervision stops when the program exits cleanly, the restart budget runs
+out, or winelocale receives SIGTERM or SIGINT; the program is then
+terminated and the caller restores the registry.
+-------------------------------------------------------------------------------
+'''
+
+import collections
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from winelocale.capture import READ_SIZE
+
+RESTART_BUDGET = 5
+RESTART_WINDOW = 300.0
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 60.0
+# A program running this long is considered up again, resetting the backoff
+STABLE_SECONDS = 60.0
+POLL_INTERVAL = 0.5
+TERMINATE_TIMEOUT = 10.0
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def _pump(pipe, sinks):
+    with pipe:
+        fd = pipe.fileno()
+        while True:
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                break
+            for sink in sinks:
+                sink.write(data)
+
+
+def backoffDelay(failures, initial=BACKOFF_INITIAL, maximum=BACKOFF_MAX):
+    "Returns the delay before restarting after consecutive failures."
+    if failures <= 0:
+        return 0.0
+    return min(initial * 2 ** (failures - 1), maximum)
+
+
+class RestartPolicy:
+    """Decides whether and when a crashed program is restarted.
+
+At most budget restarts are allowed within any window seconds. The delay
+doubles with every consecutive crash, starting at initial and capped at
+maximum, and starts over once the program stayed up STABLE_SECONDS."""
+    def __init__(self, budget=RESTART_BUDGET, window=RESTART_WINDOW,
+                 initial=BACKOFF_INITIAL, maximum=BACKOFF_MAX):
+        if budget < 0:
+            raise ValueError(f"the restart budget must not be negative, "
+                             f"not {budget!r}")
+        self.budget = budget
+        self.window = window
+        self.initial = initial
+        self.maximum = maximum
+        self.failures = 0
+        self.restarts = collections.deque()
+
+    def crashed(self, now, uptime):
+        """Records a crash at time now of a program that ran uptime seconds.
+
+Returns the delay before restarting, or None when the budget is spent."""
+        if uptime >= STABLE_SECONDS:
+            self.failures = 0
+        self.failures += 1
+        while self.restarts and now - self.restarts[0] > self.window:
+            self.restarts.popleft()
+        if len(self.restarts) >= self.budget:
+            return None
+        return backoffDelay(self.failures, self.initial, self.maximum)
+
+    def restarted(self, now):
+        "Records a restart at time now."
+        self.restarts.append(now)
+
+
+class Supervisor:
+    """Runs a command, restarting it whenever it exits with an error.
+
+A Supervisor runs once. stop() may be called from any thread or signal
+handler, before or during run()."""
+    def __init__(self, budget=RESTART_BUDGET, window=RESTART_WINDOW,
+                 initial=BACKOFF_INITIAL, maximum=BACKOFF_MAX):
+        self.policy = RestartPolicy(budget, window, initial, maximum)
+        self.crashes = 0
+        self.stopping = False
+        self.process = None
+        # Reentrant, as stop() may run as a signal handler in the main thread
+        self.wakeLock = threading.RLock()
+        self.wakeRead, self.wakeWrite = os.pipe()
+        os.set_blocking(self.wakeWrite, False)
+
+    def stop(self, *ignored):
+        "Ends supervision, terminating the program."
+        self.stopping = True
+        with self.wakeLock:
+            if self.wakeWrite is None:
+                return
+            try:
+                os.write(self.wakeWrite, b"\0")
+            except BlockingIOError:
+                pass
+
+    def run(self, args, env, sinks=()):
+        """Supervises args until the program exits cleanly or is stopped.
+
+When sinks are given, the program's stdout and stderr are written to each
+of them (e.g. a capture.RingBuffer) instead of the terminal, across all
+restarts. Returns the last exit code of the program, or None if it never
+started."""
+        previous = self._installSignals()
+        try:
+            return self._supervise(args, env, sinks)
+        finally:
+            self._restoreSignals(previous)
+            with self.wakeLock:
+                os.close(self.wakeRead)
+                os.close(self.wakeWrite)
+                self.wakeRead = self.wakeWrite = None
+
+    def _supervise(self, args, env, sinks):
+        returncode = None
+        while not self.stopping:
+            started = time.monotonic()
+            try:
+                self.process, pump = self._start(args, env, sinks)
+            except OSError as e:
+                print("Execution failed:", e, file=sys.stderr)
+                return returncode
+            try:
+                if not self._waitChild(self.process):
+                    self._terminate(self.process)
+                    return self.process.returncode
+            finally:
+                if pump is not None:
+                    pump.join()
+            returncode = self.process.returncode
+            if returncode == 0 or self.stopping:
+                return returncode
+
+            self.crashes += 1
+            now = time.monotonic()
+            delay = self.policy.crashed(now, now - started)
+            if delay is None:
+                print("Program exited with", returncode, "- restart budget "
+                      "of", self.policy.budget, "in",
+                      int(self.policy.window), "s spent, giving up",
+                      file=sys.stderr)
+                return returncode
+            print("Program exited with", returncode, "- restarting in",
+                  "%.1fs" % delay, file=sys.stderr)
+            for sink in sinks:
+                sink.write(b"\n[winelocale: program exited with %d, "
+                           b"restarting]\n" % returncode)
+            if self._sleep(delay):
+                return returncode
+            self.policy.restarted(time.monotonic())
+        return returncode
+
+    def _start(self, args, env, sinks):
+        "Starts the program, with a thread copying its output to sinks."
+        if not sinks:
+            return subprocess.Popen(args, env=env), None
+        process = subprocess.Popen(args, env=env, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        pump = threading.Thread(target=_pump, args=(process.stdout, sinks),
+                                daemon=True)
+        pump.start()
+        return process, pump
+
+    def _waitChild(self, process):
+        """Waits for the program to exit or for stop().
+
+Returns True when the program exited, False when supervision was stopped."""
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            pidfd = None
+        if pidfd is None:
+            while not self.stopping:
+                try:
+                    process.wait(timeout=POLL_INTERVAL)
+                    return True
+                except subprocess.TimeoutExpired:
+                    pass
+            return False
+        try:
+            poller = select.poll()
+            poller.register(pidfd, select.POLLIN)
+            poller.register(self.wakeRead, select.POLLIN)
+            while True:
+                events = dict(poller.poll())
+                if pidfd in events:
+                    process.wait()
+                    return True
+                if self.stopping:
+                    return False
+        finally:
+            os.close(pidfd)
+
+    def _sleep(self, seconds):
+        "Sleeps unless stopped first; returns True if stopped."
+        deadline = time.monotonic() + seconds
+        poller = select.poll()
+        poller.register(self.wakeRead, select.POLLIN)
+        while not self.stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            poller.poll(int(remaining * 1000) + 1)
+        return True
+
+    def _terminate(self, process):
+        if process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=TERMINATE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def _installSignals(self):
+        # Signal handlers can only be set from the main thread; embedders
+        # supervising from another thread call stop() themselves
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+        return {signum: signal.signal(signum, self.stop)
+                for signum in STOP_SIGNALS}
+
+    def _restoreSignals(self, previous):
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
@@ -40,18 +40,22 @@ POSSIBILITY OF SUCH DAMAGE.
 import sys
 import os
 import subprocess
-import pango
 import configparser
-import gi
-from dataclasses import dataclass
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Mapping
 
 from pathlib import Path
-from struct import pack, unpack
-from gnome import url_show
-import importlib.resources as resources
+from struct import Struct, error as StructError
 
-gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk
+from winelocale import (capture, catalog, history, locales, supervisor,
+                        xvfb)
+from winelocale.metrics import (BASE_DPI, GTKTABLE_96, SUPPORTED_DPI,
+                                fontMetrics)
 
 '''
 -------------------------------------------------------------------------------
@@ -68,38 +72,44 @@ DESCRIP = "WineLocale clones the functionality of Microsoft AppLocale in " + \
           "settings in the Wine registry to ensure proper display of " + \
           "non-Latin type in pre-Unicode portable executables."
 WEBSITE = "http://code.google.com/p/winelocale/"
-CONFIG = Path(os.environ["HOME"]) / ".winelocalerc"
 I18N = "i18n"
 ICON_FILENAME = "winelocale.svg"
 TEMP = Path("/tmp/")
-LICENSE = "LICENSE"
+LICENSE_FILENAME = "LICENSE"
 APP_ID = "com.google.code.winelocale"
 
 '''
 -------------------------------------------------------------------------------
 Pull in the translation that matches our locale
+
+Nothing is read at import time. Strings come from the compiled catalog (see
+catalog.py), loaded on first use and decoded a section at a time.
 -------------------------------------------------------------------------------
 '''
-# Pull in strings
 DEFAULT_LANG_CODE = 'en_US'
-projectFiles = resources.files('winelocale')
-ICON_FILE_PATH = projectFiles / 'icons' / ICON_FILENAME
-langCode = os.environ["LANG"][0:5]
-
-# TODO: refactor to reduce code reuse
-if langCode != DEFAULT_LANG_CODE:
-    i18nFilePath = projectFiles / 'i18n' / f'{langCode.lang}'
-    with resources.as_file(i18nFilePath) as filePath:
-        if not filePath.exists():
-            print(f"Unable to find a language file for {langCode}"
-                  ", using en_US", file=sys.stderr)
-            langCode = DEFAULT_LANG_CODE
-
-STRINGS = configparser.ConfigParser()
-i18nFilePath = projectFiles / 'i18n' / f'{langCode.lang}'
-with resources.as_file(projectFiles / 'i18n' / f'{langCode.lang}') as filePath:
-    with open(filePath) as stringsFh:
-        STRINGS.readfp(stringsFh)
+
+
+def configPath():
+    "Returns the location of the user's config file."
+    return Path(os.environ["HOME"]) / ".winelocalerc"
+
+
+def getStrings(langCode=None):
+    """Returns the translated strings for langCode (default: from $LANG).
+
+Falls back to en_US when there is no translation for the language."""
+    if langCode is None:
+        langCode = os.environ.get("LANG", DEFAULT_LANG_CODE)
+    return catalog.loadStrings(langCode)
+
+
+def __getattr__(name):
+    # Module level STRINGS and CONFIG used to be computed at import time
+    if name == "STRINGS":
+        return getStrings()
+    if name == "CONFIG":
+        return configPath()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 '''
 -------------------------------------------------------------------------------
@@ -110,25 +120,9 @@ PANGO_SCALE = 1024   # Why isn't this set in Python's pango module?
 # variable seems unused
 # WINE_MENUBAR = 0      # Need to hack this to match
 
-# 96dpi table (default)
 # Pango sizes do not match up to the sizes at which Wine draws
-# the menubar. We need to hack the Pango size to the Wine font
-# size and make the menubar match up.
-# Hope a beta tester can help if someone needs another dpi!
-# And no, this has NOTHING to do with the Wine dpi setting.
-
-GTKTABLE_96 = {
-    6: (9, 15),
-    7: (10, 17),
-    8: (11, 18),
-    9: (13, 20),
-    10: (14, 22),
-    11: (15, 23),
-    12: (16, 24),
-    13: (18, 27),
-    14: (20, 28),
-    16: (22, 31)
-}
+# the menubar. GTKTABLE_96 and the model built on it for other sizes
+# and dpi settings live in metrics.py.
 
 '''
 -------------------------------------------------------------------------------
@@ -208,6 +202,118 @@ FF_MODERN = 3 << 4
 FF_SCRIPT = 4 << 4
 FF_DECORATIVE = 5 << 4
 
+# Face name length including the \0, in UTF-16 code units
+LF_FACESIZE = 32
+
+
+class LogFont:
+    """An immutable LOGFONT.
+
+Field names follow the Win32 structure. lfHeight holds the Gtk point size
+until getBinaryLogFont() swaps in the Wine pixel height. Derive modified
+copies with replace(). Item access (logFont["lfHeight"]) is kept for code
+written against the old dict representation.
+"""
+    __slots__ = ("lfHeight", "lfWidth", "lfEscapement", "lfOrientation",
+                 "lfWeight", "lfItalic", "lfUnderline", "lfStrikeOut",
+                 "lfCharSet", "lfOutPrecision", "lfClipPrecision",
+                 "lfQuality", "lfPitchAndFamily", "lfFaceName")
+
+    # Everything up to the face name, see getBinaryLogFont()
+    STRUCT = Struct("<lllllBBBBBBBB")
+    SIZE = STRUCT.size + LF_FACESIZE * 2
+
+    def __init__(self, lfHeight=10, lfWidth=0, lfEscapement=0,
+                 lfOrientation=0, lfWeight=FW_NORMAL, lfItalic=0,
+                 lfUnderline=0, lfStrikeOut=0, lfCharSet=DEFAULT_CHARSET,
+                 lfOutPrecision=OUT_DEFAULT_PRECIS,
+                 lfClipPrecision=CLIP_DEFAULT_PRECIS,
+                 lfQuality=DEFAULT_QUALITY,
+                 lfPitchAndFamily=VARIABLE_PITCH ^ FF_SWISS,
+                 lfFaceName="Bitstream Vera Sans"):
+        init = object.__setattr__
+        init(self, "lfHeight", lfHeight)
+        init(self, "lfWidth", lfWidth)
+        init(self, "lfEscapement", lfEscapement)
+        init(self, "lfOrientation", lfOrientation)
+        init(self, "lfWeight", lfWeight)
+        init(self, "lfItalic", int(lfItalic))
+        init(self, "lfUnderline", int(lfUnderline))
+        init(self, "lfStrikeOut", int(lfStrikeOut))
+        init(self, "lfCharSet", lfCharSet)
+        init(self, "lfOutPrecision", lfOutPrecision)
+        init(self, "lfClipPrecision", lfClipPrecision)
+        init(self, "lfQuality", lfQuality)
+        init(self, "lfPitchAndFamily", lfPitchAndFamily)
+        init(self, "lfFaceName", lfFaceName)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LogFont is immutable, use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("LogFont is immutable")
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def keys(self):
+        return self.__slots__
+
+    def astuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, LogFont):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __hash__(self):
+        return hash(self.astuple())
+
+    def __repr__(self):
+        return "LogFont(" + ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__slots__) + ")"
+
+    def replace(self, **changes):
+        "Returns a copy with the given fields changed."
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return LogFont(**fields)
+
+    def pack(self):
+        """Returns the SIZE byte LOGFONTW structure.
+
+The face name is cut to 31 UTF-16 code units so the \\0 always fits,
+even if that splits a surrogate pair. lfHeight must be a whole number by
+now; a fractional Gtk point size is turned into pixels by
+getBinaryLogFont() first, and raises ValueError here."""
+        if not float(self.lfHeight).is_integer():
+            raise ValueError(f"cannot pack the fractional lfHeight "
+                             f"{self.lfHeight!r}")
+        faceName = self.lfFaceName.encode("utf-16-le", "surrogatepass")
+        faceName = faceName[0:(LF_FACESIZE - 1) * 2]
+        return self.STRUCT.pack(int(self.lfHeight), self.lfWidth,
+                                self.lfEscapement, self.lfOrientation,
+                                self.lfWeight, self.lfItalic,
+                                self.lfUnderline, self.lfStrikeOut,
+                                self.lfCharSet, self.lfOutPrecision,
+                                self.lfClipPrecision, self.lfQuality,
+                                self.lfPitchAndFamily) + \
+            faceName.ljust(LF_FACESIZE * 2, b"\0")
+
+    @classmethod
+    def unpack(cls, data):
+        "Builds a LogFont from a packed LOGFONTW structure."
+        fields = cls.STRUCT.unpack_from(data)
+        faceName = bytes(data[cls.STRUCT.size:cls.SIZE])
+        end = 0
+        while end < len(faceName) and faceName[end:end + 2] != b"\0\0":
+            end += 2
+        return cls(*fields, lfFaceName=faceName[0:end].decode(
+            "utf-16-le", "surrogatepass"))
+
 '''
 -------------------------------------------------------------------------------
 Registry patches
@@ -225,6 +331,9 @@ REG_SET120DPI = "[HKEY_CURRENT_CONFIG\\Software\\Fonts]\n" + \
 REG_SET96DPI = "[HKEY_CURRENT_CONFIG\\Software\\Fonts]\n" + \
                 "\"LogPixels\"=dword:00000060\n\n"
 
+REG_SETDPI = "[HKEY_CURRENT_CONFIG\\Software\\Fonts]\n" + \
+             "\"LogPixels\"=dword:%08x\n\n"
+
 REG_SMOOTHING = "[HKEY_CURRENT_USER\\Control Panel\\Desktop]\n" + \
                 "\"FontSmoothing\"=\"2\"\n" + \
                 "\"FontSmoothingGamma\"=dword:00000578\n" + \
@@ -325,25 +434,9 @@ REG_METRICS = {
 }
 
 
-@dataclass
-class Config:
-    logFont: dict = {
-        "lfHeight":         10,
-        "lfWidth":          0,
-        "lfEscapement":     0,
-        "lfOrientation":    0,
-        "lfWeight":         400,
-        "lfItalic":         0,
-        "lfUnderline":      0,
-        "lfStrikeOut":      0,
-        "lfCharSet":        DEFAULT_CHARSET,
-        "lfOutPrecision":   0,
-        "lfClipPrecision":  0,
-        "lfQuality":        0,
-        "lfPitchAndFamily": VARIABLE_PITCH ^ FF_SWISS,
-        "lfFaceName":       "Bitstream Vera Sans"
-    }
-    haveFonts: dict = {
+def defaultHaveFonts():
+    "Returns a new dict of the fonts we look for, none of them found yet."
+    return {
         "AR PL UMing CN": False,
         "AR PL UMing TW": False,
         "Kochi Gothic": False,
@@ -351,11 +444,73 @@ class Config:
         "UnBatang": False,
         "UnDotum": False
     }
+
+
+# Config file options recording which of our fonts were found
+HAVE_FONT_OPTIONS = (
+    ("AR PL UMing CN", "has_umingc"),
+    ("AR PL UMing TW", "has_umingt"),
+    ("Kochi Gothic", "has_kgoth"),
+    ("Kochi Mincho", "has_kmin"),
+    ("UnBatang", "has_batang"),
+    ("UnDotum", "has_dotum"),
+)
+
+# Binary sidecar of the config file: magic, config file mtime and size,
+# font size, weight, italic, flag bits, found font bits, then the UTF-8
+# face name and locale whose lengths close the header.
+CONFIG_CACHE_MAGIC = b"WLC1"
+CONFIG_CACHE = Struct("<4sqqdlBBBHH")
+
+
+def configCachePath(configFile):
+    "Returns the binary cache belonging to a config file."
+    return configFile.with_name(configFile.name + ".cache")
+
+
+def fontSize(size):
+    "Normalizes a point size, keeping whole sizes as ints."
+    size = float(size)
+    return int(size) if size.is_integer() else size
+
+
+@dataclass
+class Config:
+    logFont: LogFont = field(default_factory=LogFont)
+    haveFonts: dict = field(default_factory=defaultHaveFonts)
     locale: str = "en_US"
     useSmoothing: bool = None
     useHiDpiFont: bool = None
     useShortcut: bool = None
+    dpi: int = None
     programPath: Path = None
+    debugChannels: str = None
+    captureSize: int = capture.CAPTURE_SIZE
+    spillPath: Path = None
+    supervise: bool = False
+    restartBudget: int = supervisor.RESTART_BUDGET
+    useXvfb: bool = False
+    xvfbPool: int = xvfb.POOL_SIZE
+    screenshotPath: Path = None
+    screenshotDelay: float = xvfb.SCREENSHOT_DELAY
+    configFile: Path = None
+
+    def getConfigFile(self):
+        "Returns the config file used by this instance."
+        return self.configFile if self.configFile is not None \
+            else configPath()
+
+    def toLaunchSpec(self):
+        "Returns an immutable LaunchSpec for the current settings."
+        return LaunchSpec(programPath=Path(self.programPath),
+                          locale=self.locale,
+                          logFont=self.logFont,
+                          useSmoothing=bool(self.useSmoothing),
+                          useHiDpiFont=bool(self.useHiDpiFont),
+                          dpi=self.dpi,
+                          debugChannels=self.debugChannels,
+                          captureSize=self.captureSize,
+                          spillPath=self.spillPath)
 
     def updateConfigFile(self):
         "Wipes the config file and populates it with default values."
@@ -363,81 +518,152 @@ class Config:
         config.add_section("settings")
         # Main settings
         config.set("settings", "locale", self.locale)
-        config.set("settings", "gtkfontname", self.logFont["lfFaceName"])
-        config.set("settings", "gtkfontsize", str(self.logFont["lfHeight"]))
-        config.set("settings", "gtkfontweight", str(self.logFont["lfWeight"]))
-        config.set("settings", "gtkfontitalic",
-                   str(int(self.logFont["lfItalic"])))
-        config.set("settings", "shortcut", str(int(self.useShortcut)))
-        config.set("settings", "smoothing", str(int(self.useSmoothing)))
-        config.set("settings", "hidpifont", str(int(self.useHiDpiFont)))
-        config.set("settings", "has_batang",
-                   str(int(self.haveFonts["UnBatang"])))
-        config.set("settings", "has_dotum",
-                   str(int(self.haveFonts["UnDotum"])))
-        config.set("settings", "has_umingt",
-                   str(int(self.haveFonts["AR PL UMing TW"])))
-        config.set("settings", "has_umingc",
-                   str(int(self.haveFonts["AR PL UMing CN"])))
-        config.set("settings", "has_kgoth",
-                   str(int(self.haveFonts["Kochi Gothic"])))
-        config.set("settings", "has_kmin",
-                   str(int(self.haveFonts["Kochi Mincho"])))
-        with open(CONFIG, 'w') as configfp:
+        config.set("settings", "gtkfontname", self.logFont.lfFaceName)
+        config.set("settings", "gtkfontsize", str(self.logFont.lfHeight))
+        config.set("settings", "gtkfontweight", str(self.logFont.lfWeight))
+        config.set("settings", "gtkfontitalic", str(self.logFont.lfItalic))
+        config.set("settings", "shortcut", str(int(bool(self.useShortcut))))
+        config.set("settings", "smoothing",
+                   str(int(bool(self.useSmoothing))))
+        config.set("settings", "hidpifont",
+                   str(int(bool(self.useHiDpiFont))))
+        for fontName, option in HAVE_FONT_OPTIONS:
+            config.set("settings", option,
+                       str(int(self.haveFonts[fontName])))
+        configFile = self.getConfigFile()
+        with open(configFile, 'w') as configfp:
             config.write(configfp)
+        self.writeConfigCache(configFile)
         return
 
     def updateConfigFromFile(self):
-        "Update configuration using the config file"
-        if not CONFIG.exists():
+        """Update configuration using the config file
+
+The binary cache next to the config file is used while it is newer than
+the last edit of the config file; otherwise the config file is parsed and
+the cache rewritten."""
+        configFile = self.getConfigFile()
+        if not configFile.exists():
             self.updateConfigFile()
+            return
+        if self.readConfigCache(configFile):
+            return
 
         cp = configparser.ConfigParser()
-        with open(CONFIG, 'r') as configfp:
-            cp.readfp(configfp)
-
-        self.logFont["lfHeight"] = cp.getint("settings", "gtkfontsize",
-                                             self.logFont["lfHeight"])
-        self.logFont["lfWeight"] = cp.getint("settings", "gtkfontweight",
-                                             self.logFont["lfWeight"])
-        self.logFont["lfItalic"] = cp.getboolean("settings", "gtkfontitalic",
-                                                 self.logFont["lfItalic"])
-        if self.logFont["lfHeight"] == 1:
-            self.logFont["lfQuality"] = CLEARTYPE_QUALITY
-        else:
-            self.logFont["lfQuality"] = DEFAULT_QUALITY
-        self.logFont["lfFaceName"] = cp.get("settings", "gtkfontname",
-                                            self.logFont["lfFaceName"])
-
-        self.haveFonts["AR PL UMing CN"] = \
-            cp.getboolean("settings", "has_umingc",
-                          self.haveFonts["AR PL UMing CN"])
-        self.haveFonts["AR PL UMing TW"] = \
-            cp.getboolean("settings", "has_umingt",
-                          self.haveFonts["AR PL UMing TW"])
-        self.haveFonts["Kochi Gothic"] = \
-            cp.getboolean("settings", "has_kgoth",
-                          self.haveFonts["Kochi Gothic"])
-        self.haveFonts["Kochi Mincho"] = \
-            cp.getboolean("settings", "has_kmin",
-                          self.haveFonts["Kochi Mincho"])
-        self.haveFonts["UnBatang"] = \
-            cp.getboolean("settings", "has_batang",
-                          self.haveFonts["UnBatang"])
-        self.haveFonts["UnDotum"] = \
-            cp.getboolean("settings", "has_dotum",
-                          self.haveFonts["UnDotum"])
+        with open(configFile, 'r') as configfp:
+            cp.read_file(configfp)
+
+        lfHeight = fontSize(cp.getfloat("settings", "gtkfontsize",
+                                        fallback=self.logFont.lfHeight))
+        self.logFont = self.logFont.replace(
+            lfHeight=lfHeight,
+            lfWeight=cp.getint("settings", "gtkfontweight",
+                               fallback=self.logFont.lfWeight),
+            lfItalic=cp.getboolean("settings", "gtkfontitalic",
+                                   fallback=self.logFont.lfItalic),
+            lfQuality=CLEARTYPE_QUALITY if lfHeight == 1
+            else DEFAULT_QUALITY,
+            lfFaceName=cp.get("settings", "gtkfontname",
+                              fallback=self.logFont.lfFaceName))
+        for fontName, option in HAVE_FONT_OPTIONS:
+            self.haveFonts[fontName] = \
+                cp.getboolean("settings", option,
+                              fallback=self.haveFonts[fontName])
         self.locale = cp.get("settings", "locale")
         self.useSmoothing = cp.getboolean("settings", "smoothing")
         self.useHiDpiFont = cp.getboolean("settings", "hidpifont")
         self.useShortcut = cp.getboolean("settings", "shortcut")
+        self.writeConfigCache(configFile)
         return
 
+    def writeConfigCache(self, configFile):
+        "Stores the settings in the binary cache next to configFile."
+        flags = 0
+        for bit, value in enumerate((self.useSmoothing, self.useHiDpiFont,
+                                     self.useShortcut)):
+            flags |= bool(value) << bit
+        fonts = 0
+        for bit, (fontName, option) in enumerate(HAVE_FONT_OPTIONS):
+            fonts |= bool(self.haveFonts[fontName]) << bit
+        cachePath = configCachePath(configFile)
+        try:
+            stat = configFile.stat()
+            faceName = self.logFont.lfFaceName.encode("utf-8")
+            locale = self.locale.encode("utf-8")
+            data = CONFIG_CACHE.pack(CONFIG_CACHE_MAGIC, stat.st_mtime_ns,
+                                     stat.st_size, self.logFont.lfHeight,
+                                     self.logFont.lfWeight,
+                                     self.logFont.lfItalic, flags, fonts,
+                                     len(faceName), len(locale)) + \
+                faceName + locale
+            tempPath = cachePath.with_name(cachePath.name + ".tmp")
+            tempPath.write_bytes(data)
+            os.replace(tempPath, cachePath)
+        except OSError:
+            # The cache only saves time, the config file is what counts
+            pass
+
+    def readConfigCache(self, configFile):
+        """Loads the settings from the binary cache next to configFile.
+
+Returns False, leaving the settings alone, when the cache is missing, stale
+or unreadable."""
+        try:
+            stat = configFile.stat()
+            data = configCachePath(configFile).read_bytes()
+            magic, mtime, size, lfHeight, lfWeight, lfItalic, flags, fonts, \
+                faceLength, localeLength = CONFIG_CACHE.unpack_from(data)
+            if magic != CONFIG_CACHE_MAGIC or mtime != stat.st_mtime_ns or \
+               size != stat.st_size or \
+               len(data) != CONFIG_CACHE.size + faceLength + localeLength:
+                return False
+            offset = CONFIG_CACHE.size
+            faceName = data[offset:offset + faceLength].decode("utf-8")
+            offset += faceLength
+            locale = data[offset:offset + localeLength].decode("utf-8")
+        except (OSError, StructError, ValueError):
+            # A truncated cache raises struct.error, bad UTF-8 a ValueError
+            return False
+
+        lfHeight = fontSize(lfHeight)
+        self.logFont = self.logFont.replace(
+            lfHeight=lfHeight, lfWeight=lfWeight, lfItalic=lfItalic,
+            lfQuality=CLEARTYPE_QUALITY if lfHeight == 1
+            else DEFAULT_QUALITY,
+            lfFaceName=faceName)
+        for bit, (fontName, option) in enumerate(HAVE_FONT_OPTIONS):
+            self.haveFonts[fontName] = bool(fonts >> bit & 1)
+        self.locale = locale
+        self.useSmoothing = bool(flags & 1)
+        self.useHiDpiFont = bool(flags & 2)
+        self.useShortcut = bool(flags & 4)
+        return True
+
     def updateConfigFromArgs(self, args):
         if not isinstance(args.exe, type(None)):
             self.programPath = args.exe
         if not isinstance(args.locale, type(None)):
             self.locale = args.locale
+        if not isinstance(args.dpi, type(None)):
+            self.dpi = args.dpi
+        if not isinstance(args.debug, type(None)):
+            self.debugChannels = capture.normalizeChannels(args.debug)
+        if not isinstance(args.capture_size, type(None)):
+            self.captureSize = args.capture_size
+        if not isinstance(args.spill, type(None)):
+            self.spillPath = args.spill
+        if args.supervise:
+            self.supervise = True
+        if not isinstance(args.restarts, type(None)):
+            self.restartBudget = args.restarts
+        if args.xvfb:
+            self.useXvfb = True
+        if not isinstance(args.xvfb_pool, type(None)):
+            self.xvfbPool = args.xvfb_pool
+        if not isinstance(args.screenshot, type(None)):
+            self.screenshotPath = args.screenshot
+        if not isinstance(args.screenshot_after, type(None)):
+            self.screenshotDelay = args.screenshot_after
         return
 
 
@@ -446,279 +672,106 @@ class Config:
 List of locales
 
 This list is used to populate the drop-down menu and to know which UTF-8
-setting to apply to the environment.
+setting to apply to the environment. Only locales actually generated on the
+host are offered (see locales.py); generated UTF-8 locales missing here are
+offered under their code.
 
 Greek/Hebrew/Arabic are currently borked.
 -------------------------------------------------------------------------------
 '''
 LOCALES = {
   # "ar_AR": ("العربية", "ar_SA.UTF-8"),
+  "cs_CZ": ("Čeština", "cs_CZ.UTF-8"),
+  "da_DK": ("Dansk", "da_DK.UTF-8"),
+  "de_DE": ("Deutsch", "de_DE.UTF-8"),
   # "el_GR": ("Ελληνικά", "el_GR.UTF-8"),
+  "en_GB": ("English (UK)", "en_GB.UTF-8"),
   "en_US": ("English", "en_US.UTF-8"),
+  "es_ES": ("Español", "es_ES.UTF-8"),
+  "es_MX": ("Español (México)", "es_MX.UTF-8"),
+  "fi_FI": ("Suomi", "fi_FI.UTF-8"),
+  "fr_FR": ("Français", "fr_FR.UTF-8"),
   # "he_IL": ("עברית", "he_IL.UTF-8"),
+  "hu_HU": ("Magyar", "hu_HU.UTF-8"),
+  "it_IT": ("Italiano", "it_IT.UTF-8"),
   "ja_JP": ("日本语", "ja_JP.UTF-8"),
   "ko_KR": ("한국어", "ko_KR.UTF-8"),
+  "nb_NO": ("Norsk bokmål", "nb_NO.UTF-8"),
+  "nl_NL": ("Nederlands", "nl_NL.UTF-8"),
+  "pl_PL": ("Polski", "pl_PL.UTF-8"),
+  "pt_BR": ("Português (Brasil)", "pt_BR.UTF-8"),
+  "pt_PT": ("Português", "pt_PT.UTF-8"),
   "ru_RU": ("Русский", "ru_RU.UTF-8"),
+  "sv_SE": ("Svenska", "sv_SE.UTF-8"),
+  "tr_TR": ("Türkçe", "tr_TR.UTF-8"),
+  "uk_UA": ("Українська", "uk_UA.UTF-8"),
+  "vi_VN": ("Tiếng Việt", "vi_VN.UTF-8"),
   "zh_CN": ("中文(简体)", "zh_CN.UTF-8"),
+  "zh_HK": ("中文(香港)", "zh_HK.UTF-8"),
   "zh_TW": ("中文(繁體)", "zh_TW.UTF-8"),
   }
 
+# LOGFONT character set for each locale: the one of its Windows ANSI code
+# page, so 1252 (Western) locales get ANSI_CHARSET, 1250 ones
+# EASTEUROPE_CHARSET and 1251 ones RUSSIAN_CHARSET. Locales not listed keep
+# the character set of the LOGFONT.
+LOCALE_CHARSETS = {
+    "cs_CZ": EASTEUROPE_CHARSET,
+    "da_DK": ANSI_CHARSET,
+    "de_DE": ANSI_CHARSET,
+    "en_GB": ANSI_CHARSET,
+    "en_US": ANSI_CHARSET,
+    "es_ES": ANSI_CHARSET,
+    "es_MX": ANSI_CHARSET,
+    "fi_FI": ANSI_CHARSET,
+    "fr_FR": ANSI_CHARSET,
+    "hu_HU": EASTEUROPE_CHARSET,
+    "it_IT": ANSI_CHARSET,
+    "ja_JP": SHIFTJIS_CHARSET,
+    "ko_KR": HANGUL_CHARSET,
+    "nb_NO": ANSI_CHARSET,
+    "nl_NL": ANSI_CHARSET,
+    "pl_PL": EASTEUROPE_CHARSET,
+    "pt_BR": ANSI_CHARSET,
+    "pt_PT": ANSI_CHARSET,
+    "ru_RU": RUSSIAN_CHARSET,
+    "sv_SE": ANSI_CHARSET,
+    "tr_TR": TURKISH_CHARSET,
+    "uk_UA": RUSSIAN_CHARSET,
+    "vi_VN": VIETNAMESE_CHARSET,
+    "zh_CN": GB2312_CHARSET,
+    "zh_HK": CHINESEBIG5_CHARSET,
+    "zh_TW": CHINESEBIG5_CHARSET,
+}
 
-class WineLocaleWindow(Gtk.Window):
-    "Contains the GUI and all necessary function hooks."
-    def __init__(self, appConfig):
-        self.appConfig = appConfig
-
-        super().__init__(title=PROGRAM)
-
-        self.set_size_request(400, -1)
-
-        with resources.as_file(ICON_FILE_PATH) as filePath:
-            self.set_default_icon_from_file(filePath)
-
-        # Container element
-        self.box = Gtk.Box(Gtk.Orientation.VERTICAL, spacing=8)
-        self.add(self.box)
-
-        # Row 1
-        row1 = Gtk.Box(Gtk.Orientation.VERTICAL)
-        lblinstruct1 = Gtk.Label(STRINGS.get("gui", "lblinstruct1"))
-        lblinstruct1.set_alignment(0, 0)
-        row1.pack_start(lblinstruct1, False, False)
-        row1opts = Gtk.Box(Gtk.Orientation.HORIZONTAL, spacing=5)
-        self.txtfile = Gtk.Entry()
-        row1opts.pack_start(self.txtfile, True, True)
-        self.btnfile = Gtk.FileChooserButton("Open",
-                                             Gtk.FileChooserAction.OPEN)
-        self.btnfile.set_size_request(90, -1)
-        self.btnfile.set_label(STRINGS.get("gui", "btnfile"))
-        self.btnfile.set_image(Gtk.Image.new_from_stock(Gtk.STOCK_OPEN,
-                                                        Gtk.IconSize.MENU))
-        row1opts.pack_start(self.btnfile, False, False)
-        row1.pack_start(row1opts, False, False)
-        self.box.pack_start(row1, False, False)
-
-        # Row 2
-        row2 = Gtk.Box(Gtk.Orientation.VERTICAL)
-        lblinstruct2 = Gtk.Label(STRINGS.get("gui", "lblinstruct2"))
-        lblinstruct2.set_alignment(0, 0)
-        row2.pack_start(lblinstruct2, False, False)
-        self.cmblocales = Gtk.combo_box_new_text()
-        row2.pack_start(self.cmblocales, False, False)
-        self.box.pack_start(row2, False, False)
-
-        # Row 3
-        row3 = Gtk.Expander(STRINGS.get("gui", "expander"))
-        row3rows = Gtk.Box(Gtk.Orientation.VERTICAL)
-        self.chksmoothing = Gtk.CheckButton(STRINGS.get("gui", "chksmoothing"))
-        row3rows.pack_start(self.chksmoothing, False, False)
-        self.chk120dpi = Gtk.CheckButton(STRINGS.get("gui", "chk120dpi"))
-        row3rows.pack_start(self.chk120dpi, False, False)
-        self.chkshortcut = Gtk.CheckButton(STRINGS.get("gui", "chkshortcut"))
-        row3rows.pack_start(self.chkshortcut, False, False)
-        row3.add(row3rows)
-        self.box.pack_start(row3, True, True)
-        row3.connect("activate", self.resize)
-
-        # Row 4
-        row4 = Gtk.Box(Gtk.Orientation.HORIZONTAL, spacing=5)
-        self.btnhelp = Gtk.Button("Help", Gtk.STOCK_HELP)
-        self.btnhelp.set_label(STRINGS.get("gui", "btnhelp"))
-        self.btnhelp.set_image(Gtk.Image.new_from_stock(Gtk.STOCK_HELP,
-                                                        Gtk.IconSize.MENU))
-        self.btnhelp.set_size_request(90, -1)
-        row4.pack_start(self.btnhelp, False, False)
-        row4.pack_start(Gtk.Label(""), True, True)
-        self.btnclose = Gtk.Button("Close", Gtk.STOCK_CLOSE)
-        self.btnclose.set_label(STRINGS.get("gui", "btnclose"))
-        self.btnclose.set_image(Gtk.Image.new_from_stock(Gtk.STOCK_CLOSE,
-                                                         Gtk.IconSize.MENU))
-        self.btnclose.set_size_request(90, -1)
-        row4.pack_start(self.btnclose, False, False)
-        self.btnexecute = Gtk.Button("Execute", Gtk.STOCK_EXECUTE)
-        self.btnexecute.set_label(STRINGS.get("gui", "btnexecute"))
-        self.btnexecute.set_image(Gtk.image_new_from_stock(Gtk.STOCK_EXECUTE,
-                                                           Gtk.IconSize.MENU))
-        self.btnexecute.set_size_request(90, -1)
-        row4.pack_start(self.btnexecute, False, False)
-        self.box.pack_start(row4, False, False)
-
-        # Check which fonts exist
-        context = self.txtfile.get_pango_context()
-        set_fonts(context.list_families(), appConfig)
-
-        # Store our current Gtk font info to a LOGFONT
-        set_logfont_from_gtk(context.get_font_description(), appConfig)
-
-        # Populate the locales drop-down
-        self.localeList = getLocaleList(appConfig)
-        for langTitle, langCode in self.localeList:
-            self.cmblocales.append_text(langTitle)
-        self.cmblocales.set_active(0)
-
-        # Fix the expander to suit work area
-        self.expanded = False
-        self.flatsize = None
-        self.expasize = None
-
-        # Events
-        self.btnfile.connect("clicked", self.open)
-        self.btnclose.connect("clicked", self.destroy)
-        self.btnhelp.connect("clicked", self.about)
-        self.btnexecute.connect("clicked", self.execute)
-        getBinaryLogFont(appConfig.locale, appConfig.logFont)
-
-        # Update settings
-        if appConfig.useShortcut:
-            self.chkshortcut.set_active(True)
-        if appConfig.useSmoothing:
-            self.chksmoothing.set_active(True)
-        if appConfig.useHiDpiFont:
-            self.chk120dpi.set_active(True)
-        for i in range(0, len(self.localeList)):
-            if self.localeList[i][1][0:5] == appConfig.locale:
-                self.cmblocales.set_active(i)
-
-        if not isinstance(appConfig.programPath, type(None)):
-            self.txtfile.set_text(appConfig.programPath)
-            self.set_focus(self.btnexecute)
+# Shell Dlg patch for each locale, see REG_PATCHDLG. Locales not listed use
+# the ANSI one, as the Latin, Cyrillic and Vietnamese scripts are all
+# covered by Bitstream Vera Sans.
+LOCALE_PATCHDLG = {
+    "ja_JP": "SHIFTJIS",
+    "ko_KR": "HANGUL",
+    "zh_CN": "GB2312",
+    "zh_HK": "CHINESEBIG5",
+    "zh_TW": "CHINESEBIG5",
+}
 
-        return
 
-    '''
-    void resize()
-
-    Fix the expander to suit our work area.
-    '''
-    def resize(self, widget):
-        if isinstance(self.expasize, type(None)) and \
-           isinstance(self.flatsize, type(None)):
-            self.flatsize = self.window.get_size()
-        elif isinstance(self.expasize, type(None)):
-            self.expasize = self.window.get_size()
-        if not self.expanded and not isinstance(self.expasize, type(None)):
-            self.window.set_size_request(self.expasize[0], self.expasize[1])
-            self.window.resize(self.expasize[0], self.expasize[1])
-            self.expanded = True
-        elif self.expanded and not isinstance(self.flatsize, type(None)):
-            self.window.set_size_request(self.flatsize[0], self.flatsize[1])
-            self.window.resize(self.flatsize[0], self.flatsize[1])
-            self.expanded = False
-        elif not self.expanded:
-            self.expanded = True
-
-    '''
-    void open()
-
-    Opens file dialog and sets self.txtfile to the selected file.
-    '''
-    def open(self, widget, file_name=""):
-        buttons = (Gtk.STOCK_CANCEL, Gtk.RESPONSE_CANCEL,
-                   Gtk.STOCK_OPEN, Gtk.RESPONSE_OK)
-        dialog = Gtk.FileChooserDialog(STRINGS.get("file", "title"), None,
-                                       Gtk.FILE_CHOOSER_ACTION_OPEN, buttons)
-        # Add filters
-        filter = Gtk.FileFilter()
-        filter.set_name(STRINGS.get("file", "exefilter"))
-        filter.add_pattern("*.exe")
-        filter.add_pattern("*.EXE")
-        dialog.add_filter(filter)
-        filter = Gtk.FileFilter()
-        filter.set_name(STRINGS.get("file", "allfilter"))
-        filter.add_pattern("*")
-        dialog.add_filter(filter)
-        if dialog.run() == Gtk.RESPONSE_OK:
-            self.txtfile.set_text(dialog.get_filename())
-        dialog.destroy()
-
-    '''
-    void click_website()
-
-    Shells open the default browser to the WineLocale page.
-    '''
-    def click_website(self, dialog, link, data=None):
-        url_show(link)
-
-    '''
-    void about()
-
-    Create and display Gtk About dialog.
-    '''
-    def about(self, widget):
-        Gtk.about_dialog_set_url_hook(self.click_website)
-
-        dialog = Gtk.AboutDialog()
-        with resources.as_file(ICON_FILE_PATH) as filePath:
-            dialog.set_icon_from_file(filePath)
-        dialog.set_name(PROGRAM)
-        dialog.set_version(VERSION)
-        dialog.set_comments(STRINGS.get("about", "comments"))
-        dialog.set_copyright(COPY)
-        license = open(LICENSE, "r")
-        dialog.set_license(license.read())
-        with resources.as_file(ICON_FILE_PATH) as filePath:
-            dialog.set_logo(Gtk.gdk.pixbuf_new_from_file(filePath))
-        dialog.set_website(WEBSITE)
-        dialog.run()
-        dialog.destroy()
-
-    '''
-    void execute()
-
-    Test if everything is set that needs to be for execution. commit all
-    settings to the local config file.
-
-    LOADING READY RUN!
-    '''
-    def execute(self, widget):
-        # Should we even be doing this?
-        if(self.txtfile.get_text() == ""):
-            message = STRINGS.get("dialogs", "noexe1") + "\n\n" + \
-                      STRINGS.get("dialogs", "noexe2")
-            dialog = Gtk.MessageDialog(None, Gtk.DIALOG_MODAL,
-                                       Gtk.MESSAGE_INFO, Gtk.BUTTONS_OK,
-                                       message)
-            dialog.set_title(STRINGS.get("dialogs", "errortitle"))
-            with resources.as_file(ICON_FILE_PATH) as filePath:
-                dialog.set_icon_from_file(filePath)
-            dialog.run()
-            dialog.destroy()
-            return(0)
-
-        elif not os.path.exists(self.txtfile.get_text()):
-            message = STRINGS.get("dialogs", "exenotfound1") + "\n\n" + \
-                      STRINGS.get("dialogs", "exenotfound2")
-            dialog = Gtk.MessageDialog(None, Gtk.DIALOG_MODAL,
-                                       Gtk.MESSAGE_INFO, Gtk.BUTTONS_OK,
-                                       message)
-            dialog.set_title(STRINGS.get("dialogs", "errortitle"))
-            with resources.as_file(ICON_FILE_PATH) as filePath:
-                dialog.set_icon_from_file(filePath)
-            dialog.run()
-            dialog.destroy()
-            return(0)
-
-        self.window.hide()
-
-        # Update settings
-        self.appConfig.useShortcut = self.chkshortcut.get_active()
-        self.appConfig.useSmoothing = self.chksmoothing.get_active()
-        self.appConfig.useHiDpiFont = self.chk120dpi.get_active()
-        self.appConfig.locale = \
-            self.localeList[self.cmblocales.get_active()][1][0:5]
-        self.appConfig.programPath = Path(self.txtfile.get_text())
-        self.appConfig.updateConfigFile()
-        shellwine(self.appConfig)
-
-        Gtk.main_quit()
-
-    '''
-    void delete()
-
-    Hook to quit the GUI.
-    '''
-    def delete(self, widget, event):
-        return False
+def getLocaleEnv(locale):
+    "Returns the LANG value for a locale code such as ja_JP."
+    if locale in LOCALES:
+        return LOCALES[locale][1]
+    return locale + ".UTF-8"
+
+
+def isLocaleCode(locale):
+    """Checks that locale looks like a language_TERRITORY code.
+
+The language has two or three letters, as in ja_JP or ast_ES."""
+    language, underscore, territory = locale.partition("_")
+    return underscore == "_" and locale.isascii() and \
+        len(language) in (2, 3) and language.isalpha() and \
+        language.islower() and len(territory) == 2 and \
+        territory.isalpha() and territory.isupper()
 
 
 def get_ja(appConfig):
@@ -742,38 +795,40 @@ def get_tw(appConfig):
     return appConfig.haveFonts["AR PL UMing TW"]
 
 
-def getLocaleList(appConfig):
-    "Returns a list of all present locales."
-    localeList = [LOCALES["en_US"], LOCALES["ru_RU"]]
-    if get_cn(appConfig):
-        localeList.append(LOCALES["zh_CN"])
-    if get_tw(appConfig):
-        localeList.append(LOCALES["zh_TW"])
-    if get_ko(appConfig):
-        localeList.append(LOCALES["ko_KR"])
-    if get_ja(appConfig):
-        localeList.append(LOCALES["ja_JP"])
+# Locales that also need fonts we look for
+LOCALE_FONTS = {
+    "ja_JP": get_ja,
+    "ko_KR": get_ko,
+    "zh_CN": get_cn,
+    "zh_HK": get_tw,
+    "zh_TW": get_tw,
+}
+
+
+def getLocaleList(appConfig, index=None):
+    """Returns (title, LANG, code) for all present locales.
+
+A locale is present when it is generated on the host and, for CJK locales,
+the fonts it needs are installed. en_US comes first when it is present."""
+    index = locales.loadIndex() if index is None else index
+    localeList = []
+    codes = set(LOCALES) | locales.utf8Locales(index)
+    for code in ["en_US"] + sorted(codes - {"en_US"}):
+        if code in LOCALE_FONTS and not LOCALE_FONTS[code](appConfig):
+            continue
+        if code.partition("_")[0] in ("ar", "el", "he"):
+            # Currently borked, see above
+            continue
+        title, env = LOCALES.get(code, (code, getLocaleEnv(code)))
+        if locales.isLocaleAvailable(env, index):
+            localeList.append((title, env, code))
     return localeList
 
 
-def set_fonts(fonts, appConfig):
-    "Updates appConfig haveFonts with present system fonts."
-    for font in fonts:
-        if font.get_name() == 'UnBatang':
-            appConfig.haveFonts["UnBatang"] = True
-        elif font.get_name() == 'UnDotum':
-            appConfig.haveFonts["UnDotum"] = True
-        elif font.get_name() == 'AR PL UMing TW':
-            appConfig.haveFonts["AR PL UMing TW"] = True
-        elif font.get_name() == 'AR PL UMing CN':
-            appConfig.haveFonts["AR PL UMing CN"] = True
-        elif font.get_name() == 'Kochi Gothic':
-            appConfig.haveFonts["Kochi Gothic"] = True
-        elif font.get_name() == 'Kochi Mincho':
-            appConfig.haveFonts["Kochi Mincho"] = True
-
-
-def getBinaryLogFont(locale, logFont):
+HEXBYTES = tuple("%02x" % byte for byte in range(256))
+
+
+def getBinaryLogFont(locale, logFont, dpi=BASE_DPI):
     """string getBinaryLogFont()
 
 Build a binary LOGFONT value to pump into the registry. Wine default is
@@ -796,134 +851,87 @@ typedef struct tagLOGFONT {
   TCHAR lfFaceName[LF_FACESIZE]; //32 chars max including \0
 } LOGFONT, *PLOGFONT;
     """
-    lfCharSet = logFont["lfCharSet"]
-    if(locale == "en_US"):
-        lfCharSet = ANSI_CHARSET
-    elif(locale == "ru_RU"):
-        lfCharSet = ANSI_CHARSET
-    elif(locale == "ja_JP"):
-        lfCharSet = SHIFTJIS_CHARSET
-    elif(locale == "ko_KR"):
-        lfCharSet = HANGUL_CHARSET
-    elif(locale == "zh_CN"):
-        lfCharSet = GB2312_CHARSET
-    elif(locale == "zh_TW"):
-        lfCharSet = CHINESEBIG5_CHARSET
-
-    # Make sure we don't go over 32 character with the \0
-    tempfont = logFont["lfFaceName"]
-    tempfon2 = ""
-    if(len(tempfont) > 31):
-        tempfont = tempfont[0:31]
-    # Translate it to shorts
-    for i in range(0, len(tempfont)):
-        tempfon2 += tempfont[i:i+1] + "\0"
-    # Make the binary string
-    newstring = pack("<lllllBBBBBBBB",
-                     GTKTABLE_96[logFont["lfHeight"]][0] * -1,
-                     logFont["lfWidth"],
-                     logFont["lfEscapement"],
-                     logFont["lfOrientation"],
-                     logFont["lfWeight"],
-                     logFont["lfItalic"],
-                     logFont["lfUnderline"],
-                     logFont["lfStrikeOut"],
-                     lfCharSet,
-                     logFont["lfOutPrecision"],
-                     logFont["lfClipPrecision"],
-                     logFont["lfQuality"],
-                     logFont["lfPitchAndFamily"],
-                     ) + tempfon2
+    if not isinstance(logFont, LogFont):
+        logFont = LogFont(**logFont)
+    lfCharSet = LOCALE_CHARSETS.get(locale, logFont.lfCharSet)
+
+    # pack() makes sure we don't go over 32 characters with the \0
+    newstring = logFont.replace(
+        lfHeight=fontMetrics(logFont.lfHeight, dpi)[0] * -1,
+        lfCharSet=lfCharSet).pack()
 
     # Convert our LOGFONT to hex
-    hexstring = "hex:"
-    for i in range(len(newstring)):
-        byte = unpack("B", newstring[i:i+1])
-        hexnib = hex(byte[0])[2:]
-        if len(hexnib) < 2:
-            hexnib = "0" + hexnib
-        hexstring += hexnib + ","
-    while len(hexstring) < 277:
-        hexstring += "00,"
-    hexstring += "00"
-    return hexstring
-
-
-def set_logfont_from_gtk(pangofont, appConfig):
-    "Populates the appconfig.logFont using data from Gtk."
-    appConfig.logFont["lfFaceName"] = pangofont.get_family()
-    if pangofont.get_style() & pango.STYLE_ITALIC or pangofont.get_style() & \
-       pango.STYLE_OBLIQUE:
-        appConfig.logFont["lfItalic"] = 1
-    appConfig.logFont["lfWeight"] = pangofont.get_weight() + 0
-    appConfig.logFont["lfHeight"] = pangofont.get_size() / PANGO_SCALE
-    # variable seems unused
-    # WINE_MENUBAR = GTKTABLE_96[pangofont.get_size() / PANGO_SCALE][1]
-    appConfig.logFont["lfPitchAndFamily"] = VARIABLE_PITCH ^ FF_SWISS
-
-
-def generateRegistry(appConfig):
-    """Create a registry patch based on all config settings in
-    /tmp/winelocale.reg."""
-    locale = appConfig.locale
-    logFont = appConfig.logFont
-    with open(TEMP / "winelocale.reg", "w") as registry:
-        # Registry file header
-        registry.write(REGEDIT)
-
-        # WineLocale font core
-        registry.write(REG_FONTLINK)
-        registry.write(REG_FONTSUBS)
-
-        # Write an appropriate Shell Dlg font for the locale
-        if(locale == "en_US" or locale == "ru_RU"):
-            registry.write(REG_PATCHDLG["ANSI"])
-        elif(locale == "ja_JP"):
-            registry.write(REG_PATCHDLG["SHIFTJIS"])
-        elif(locale == "ko_KR"):
-            registry.write(REG_PATCHDLG["HANGUL"])
-        elif(locale == "zh_CN"):
-            registry.write(REG_PATCHDLG["GB2312"])
-        elif(locale == "zh_TW"):
-            registry.write(REG_PATCHDLG["CHINESEBIG5"])
-
-        # Write the window metrics fonts
-        binLogFont = getBinaryLogFont(locale, logFont)
-        registry.write(REG_METRICS["CaptionFont"] + binLogFont + "\n\n")
-        registry.write(REG_METRICS["MenuFont"] + binLogFont + "\n\n")
-        registry.write(REG_METRICS["MessageFont"] + binLogFont + "\n\n")
-        registry.write(REG_METRICS["SmCaptionFont"] + binLogFont + "\n\n")
-        registry.write(REG_METRICS["StatusFont"] + binLogFont + "\n\n")
-
-        # Fix the menubar height
-        registry.write(REG_MENUH + "\"" +
-                       str(GTKTABLE_96[appConfig.logFont["lfHeight"]][1]) +
-                       "\"\n\n")
-        registry.write(REG_MENUW + "\"" +
-                       str(GTKTABLE_96[appConfig.logFont["lfHeight"]][1]) +
-                       "\"\n\n")
-
-        # Write/remove smoothing
-
-        # Write/remove 120dpi
-        if appConfig.useHiDpiFont:
-            registry.write(REG_SET120DPI)
-        else:
-            registry.write(REG_SET96DPI)
+    return "hex:" + ",".join(map(HEXBYTES.__getitem__, newstring))
+
+
+def getDpi(useHiDpiFont=False, dpi=None):
+    "Returns the LogPixels setting: dpi if given, else 120 or 96."
+    if dpi is not None:
+        return dpi
+    return 120 if useHiDpiFont else BASE_DPI
+
+
+def buildRegistry(locale, logFont, useHiDpiFont=False, dpi=None):
+    """Returns the registry patch for the given settings as REGEDIT4 text.
+
+Font and menubar heights are scaled to the LogPixels setting, which is
+dpi when given and otherwise 120 or 96 depending on useHiDpiFont."""
+    if not isinstance(logFont, LogFont):
+        logFont = LogFont(**logFont)
+    dpi = getDpi(useHiDpiFont, dpi)
+    fontHeight, menuHeight = fontMetrics(logFont.lfHeight, dpi)
+    registry = []
+    # Registry file header
+    registry.append(REGEDIT)
+
+    # WineLocale font core
+    registry.append(REG_FONTLINK)
+    registry.append(REG_FONTSUBS)
+
+    # Write an appropriate Shell Dlg font for the locale
+    registry.append(REG_PATCHDLG[LOCALE_PATCHDLG.get(locale, "ANSI")])
+
+    # Write the window metrics fonts
+    binLogFont = getBinaryLogFont(locale, logFont, dpi)
+    registry.append(REG_METRICS["CaptionFont"] + binLogFont + "\n\n")
+    registry.append(REG_METRICS["MenuFont"] + binLogFont + "\n\n")
+    registry.append(REG_METRICS["MessageFont"] + binLogFont + "\n\n")
+    registry.append(REG_METRICS["SmCaptionFont"] + binLogFont + "\n\n")
+    registry.append(REG_METRICS["StatusFont"] + binLogFont + "\n\n")
+
+    # Fix the menubar height
+    registry.append(REG_MENUH + "\"" + str(menuHeight) + "\"\n\n")
+    registry.append(REG_MENUW + "\"" + str(menuHeight) + "\"\n\n")
+
+    # Write/remove smoothing
+
+    # Write/remove 120dpi
+    if dpi == 120:
+        registry.append(REG_SET120DPI)
+    elif dpi == BASE_DPI:
+        registry.append(REG_SET96DPI)
+    else:
+        registry.append(REG_SETDPI % dpi)
+    return "".join(registry)
+
 
-        registry.close()
+def generateRegistry(appConfig, path=None):
+    """Create a registry patch based on all config settings in
+    /tmp/winelocale.reg (or path)."""
+    if path is None:
+        path = TEMP / "winelocale.reg"
+    with open(path, "w") as registry:
+        registry.write(buildRegistry(appConfig.locale, appConfig.logFont,
+                                     appConfig.useHiDpiFont, appConfig.dpi))
     return
 
 
-def shellwine(appConfig):
-    "Prepares the registry and shells Wine."
-    initialLang = os.environ['LANG']
-    env = os.environ.copy()
-    env['WINEDEBUG'] = "-all"
-    generateRegistry(appConfig)
+def regedit(env, timer, patchPath):
+    "Applies a registry patch with Wine's regedit."
     try:
-        compProc = subprocess.run(["wine", "regedit.exe",
-                                   "/tmp/winelocale.reg"], check=True, env=env)
+        with timer.phase("regedit"):
+            compProc = subprocess.run(["wine", "regedit.exe", str(patchPath)],
+                                      check=True, env=env)
         if compProc.returncode < 0:
             print("Child was terminated by signal", -compProc.returncode,
                   file=sys.stderr)
@@ -932,29 +940,435 @@ def shellwine(appConfig):
     except (OSError, subprocess.CalledProcessError) as e:
         print("Execution failed:", e, file=sys.stderr)
 
-    winProgPath = "Z:\\" + appConfig.programPath.replace("/", "\\")
-    env['LANG'] = LOCALES[appConfig.locale][1]
-    subprocess.run(["wine", winProgPath], env=env)
-    env['LANG'] = initialLang
-    # why would this do anything different than the previous time?
-    # or shouldn't it recover the registery?
+
+'''
+-------------------------------------------------------------------------------
+Launch API
+
+For embedding winelocale in another program: describe a launch with a
+LaunchSpec, turn it into a PreparedLaunch with prepare() and run it with
+launch(). All three are immutable and nothing here touches module state, so
+launches may run concurrently from several threads. Launches sharing a Wine
+prefix are serialized, since the registry patch applies to the whole prefix.
+-------------------------------------------------------------------------------
+'''
+
+
+@dataclass(frozen=True)
+class LaunchSpec:
+    programPath: Path
+    locale: str = "en_US"
+    logFont: LogFont = field(default_factory=LogFont)
+    useSmoothing: bool = False
+    useHiDpiFont: bool = False
+    dpi: int = None
+    debugChannels: str = None
+    captureSize: int = capture.CAPTURE_SIZE
+    spillPath: Path = None
+    env: Mapping = None
+    workDir: Path = TEMP
+    display: str = None
+
+    def __post_init__(self):
+        # Take private, read-only copies so callers can't change us later
+        object.__setattr__(self, "programPath", Path(self.programPath))
+        if not isinstance(self.logFont, LogFont):
+            object.__setattr__(self, "logFont", LogFont(**self.logFont))
+        if self.env is not None:
+            object.__setattr__(self, "env", MappingProxyType(dict(self.env)))
+        if self.locale not in LOCALES and not isLocaleCode(self.locale):
+            raise ValueError(f"unsupported locale {self.locale!r}")
+        if self.dpi is not None and self.dpi not in SUPPORTED_DPI:
+            raise ValueError(f"unsupported dpi {self.dpi!r}, use one of "
+                             + ", ".join(map(str, SUPPORTED_DPI)))
+        if self.captureSize <= 0:
+            raise ValueError(f"capture size must be positive, not "
+                             f"{self.captureSize!r}")
+
+
+@dataclass(frozen=True)
+class PreparedLaunch:
+    spec: LaunchSpec
+    registry: str
+    env: Mapping
+    programEnv: Mapping
+    winProgPath: str
+    prefix: str
+
+
+@dataclass(frozen=True)
+class LaunchResult:
+    returncode: int
+    timings: Mapping
+    tailPath: Path = None
+
+
+_prefixLocks = {}
+_prefixLocksLock = threading.Lock()
+
+
+def _prefixLock(prefix):
+    with _prefixLocksLock:
+        return _prefixLocks.setdefault(prefix, threading.Lock())
+
+
+def prepare(spec, timer=None):
+    """Resolves a LaunchSpec into the registry patch and environments to use.
+
+Raises ValueError when the locale is not generated on this host, as Wine
+would otherwise silently fall back to the C locale."""
+    lang = getLocaleEnv(spec.locale)
+    if not locales.isLocaleAvailable(lang):
+        raise ValueError(f"locale {lang} is not generated on this system")
+    if timer is None:
+        timer = history.PhaseTimer()
+    with timer.phase("patch"):
+        registry = buildRegistry(spec.locale, spec.logFont,
+                                 spec.useHiDpiFont, spec.dpi)
+    env = dict(os.environ if spec.env is None else spec.env)
+    # regedit writes straight to our stdio, so only the program gets the
+    # debug channels and has its output captured
+    env['WINEDEBUG'] = "-all"
+    if spec.display is not None:
+        env['DISPLAY'] = spec.display
+    programEnv = dict(env)
+    programEnv['LANG'] = lang
+    if spec.debugChannels:
+        programEnv['WINEDEBUG'] = spec.debugChannels
+    winProgPath = "Z:" + str(spec.programPath).replace("/", "\\")
+    return PreparedLaunch(spec=spec, registry=registry,
+                          env=MappingProxyType(env),
+                          programEnv=MappingProxyType(programEnv),
+                          winProgPath=winProgPath,
+                          prefix=history.getWinePrefix(env))
+
+
+def launch(prepared, timer=None, onStart=None):
+    """Patches the registry, runs the program and returns a LaunchResult.
+
+Phase durations are added to timer when one is given. onStart, if given,
+is called with no arguments right before the program starts."""
+    if timer is None:
+        timer = history.PhaseTimer()
+    spec = prepared.spec
+    env = dict(prepared.env)
+    returncode = None
+    tailPath = None
+    with _prefixLock(prepared.prefix):
+        fd, patchPath = tempfile.mkstemp(prefix="winelocale-", suffix=".reg",
+                                         dir=spec.workDir)
+        try:
+            with os.fdopen(fd, "w") as registry:
+                registry.write(prepared.registry)
+            regedit(env, timer, patchPath)
+            try:
+                if onStart is not None:
+                    onStart()
+                with timer.phase("runtime"):
+                    if spec.debugChannels:
+                        returncode, tailPath = runCaptured(
+                            spec, prepared.winProgPath,
+                            dict(prepared.programEnv))
+                    else:
+                        returncode = subprocess.run(
+                            ["wine", prepared.winProgPath],
+                            env=dict(prepared.programEnv)).returncode
+            except OSError as e:
+                print("Execution failed:", e, file=sys.stderr)
+            finally:
+                # why would this do anything different than the previous
+                # time? or shouldn't it recover the registery?
+                regedit(env, timer, patchPath)
+        finally:
+            os.unlink(patchPath)
+    return LaunchResult(returncode=returncode,
+                        timings=MappingProxyType(dict(timer.timings)),
+                        tailPath=tailPath)
+
+
+def supervise(prepared, timer=None, budget=supervisor.RESTART_BUDGET,
+              window=supervisor.RESTART_WINDOW, supervision=None,
+              onStart=None):
+    """Like launch(), but restarts the program whenever it crashes.
+
+The registry is patched once before the first start and only restored when
+supervision ends, so a restart costs no more than starting Wine. See
+supervisor.py for the restart policy. To end supervision from another
+thread, pass a supervisor.Supervisor as supervision and call its stop();
+budget and window are then taken from it. onStart is called as in launch(),
+before the first start only.
+
+With debug channels, the output of every run goes through one ring buffer,
+whose tail is saved if the program ever crashed."""
+    if timer is None:
+        timer = history.PhaseTimer()
+    if supervision is None:
+        supervision = supervisor.Supervisor(budget, window)
+    spec = prepared.spec
+    env = dict(prepared.env)
+    returncode = None
+    tailPath = None
+    ring = None
+    sinks = ()
+    with _prefixLock(prepared.prefix):
+        fd, patchPath = tempfile.mkstemp(prefix="winelocale-", suffix=".reg",
+                                         dir=spec.workDir)
+        try:
+            with os.fdopen(fd, "w") as registry:
+                registry.write(prepared.registry)
+            regedit(env, timer, patchPath)
+            spill = None
+            try:
+                if spec.debugChannels:
+                    ring = capture.RingBuffer(spec.captureSize)
+                    sinks = (ring,)
+                    if spec.spillPath:
+                        spill = capture.SpillFile(spec.spillPath)
+                        sinks += (spill,)
+                if onStart is not None:
+                    onStart()
+                with timer.phase("runtime"):
+                    returncode = supervision.run(
+                        ["wine", prepared.winProgPath],
+                        dict(prepared.programEnv), sinks)
+            finally:
+                if spill is not None:
+                    spill.close()
+                regedit(env, timer, patchPath)
+        finally:
+            os.unlink(patchPath)
+    if ring is not None and (returncode != 0 or supervision.crashes):
+        tailPath = saveTail(spec, returncode, ring)
+    return LaunchResult(returncode=returncode,
+                        timings=MappingProxyType(dict(timer.timings)),
+                        tailPath=tailPath)
+
+
+def saveTail(spec, returncode, ring):
+    "Saves captured output in the spec's work directory; returns its path."
+    tailPath = Path(spec.workDir) / "winelocale-{}-{}-{}.log".format(
+        spec.programPath.stem, time.strftime("%Y%m%d-%H%M%S"),
+        threading.get_ident())
+    capture.saveTail(ring, tailPath)
+    print("Program exited with", returncode, "- last",
+          len(ring.getvalue()), "bytes of output saved to", tailPath,
+          file=sys.stderr)
+    return tailPath
+
+
+def runCaptured(spec, winProgPath, env):
+    """Runs the program with its output going through a bounded ring buffer.
+
+On a non-zero exit the captured tail is saved in the spec's work directory.
+Returns (returncode, tailPath)."""
+    returncode, ring = capture.runCaptured(["wine", winProgPath], env,
+                                           spec.captureSize, spec.spillPath)
+    tailPath = None
+    if returncode != 0:
+        tailPath = saveTail(spec, returncode, ring)
+    return returncode, tailPath
+
+
+def shellwine(appConfig, timer=None):
+    """Prepares the registry and shells Wine.
+
+Returns the exit code of the program, or None if it could not be started.
+Phase durations are added to timer when one is given. With useXvfb the
+program runs on a display leased from the Xvfb pool (see xvfb.py), and a
+screenshot is taken screenshotDelay seconds after it started if
+screenshotPath is set."""
+    if timer is None:
+        timer = history.PhaseTimer()
+    spec = appConfig.toLaunchSpec()
+    lease = None
+    shots = []
+    onStart = None
+    if appConfig.useXvfb:
+        with timer.phase("display"):
+            lease = xvfb.DisplayPool(appConfig.xvfbPool).lease()
+        spec = replace(spec, display=lease.display)
+        if appConfig.screenshotPath is not None:
+            def onStart():
+                shots.append(lease.scheduleScreenshot(
+                    appConfig.screenshotPath, appConfig.screenshotDelay))
     try:
-        compProc = subprocess.run(["wine", "regedit.exe",
-                                   "/tmp/winelocale.reg"], check=True, env=env)
-        if compProc.returncode < 0:
-            print("Child was terminated by signal", -compProc.returncode,
+        prepared = prepare(spec, timer)
+        if appConfig.supervise:
+            return supervise(prepared, timer, appConfig.restartBudget,
+                             onStart=onStart).returncode
+        return launch(prepared, timer, onStart).returncode
+    finally:
+        for shot in shots:
+            if not shot.finished.is_set():
+                print("Program exited before the screenshot was due",
+                      file=sys.stderr)
+            shot.cancel()
+            shot.join()
+        if lease is not None:
+            lease.release()
+
+
+def recordLaunch(appConfig, timer, returncode):
+    "Stores the launch in the history database used by `winelocale stats`."
+    try:
+        history.recordLaunch(Path(appConfig.programPath).resolve(),
+                             appConfig.locale, history.getWinePrefix(),
+                             timer.timings, returncode)
+    except (OSError, sqlite3.Error) as e:
+        print("Unable to record launch history:", e, file=sys.stderr)
+
+
+'''
+-------------------------------------------------------------------------------
+Image export
+
+For prefixes baked into container images: `winelocale export` resolves the
+registry patch and the environment once, at image build time, and writes
+them out with a launch wrapper. The image build applies the patch with
+`wine regedit.exe winelocale.reg`; afterwards the wrapper starts the program
+with no winelocale, Gtk or regedit work at all.
+-------------------------------------------------------------------------------
+'''
+EXPORT_REGISTRY = "winelocale.reg"
+EXPORT_ENV = "winelocale.env"
+EXPORT_WRAPPER = "winelocale-run"
+
+WRAPPER = """#!/bin/sh
+# Generated by winelocale {version} export for {locale}.
+# Apply {registry} to the prefix once, e.g. while building the image:
+#   wine regedit.exe {registry}
+export LANG={lang}
+export WINEDEBUG={winedebug}
+exec wine {program}"$@"
+"""
+
+
+def exportEnv(appConfig):
+    "Returns the environment the program runs with, as a dict."
+    return {"LANG": getLocaleEnv(appConfig.locale),
+            "WINEDEBUG": appConfig.debugChannels or "-all"}
+
+
+def writeExport(appConfig, directory):
+    """Writes the registry patch, env file and launch wrapper to directory.
+
+The env file holds one VAR=value per line, as read by `docker run
+--env-file` and systemd's EnvironmentFile=. Returns the written paths."""
+    import shlex
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    registryPath = directory / EXPORT_REGISTRY
+    generateRegistry(appConfig, registryPath)
+
+    env = exportEnv(appConfig)
+    envPath = directory / EXPORT_ENV
+    with open(envPath, "w") as envFile:
+        for name, value in env.items():
+            envFile.write(f"{name}={value}\n")
+
+    program = ""
+    if appConfig.programPath is not None:
+        winProgPath = "Z:" + str(appConfig.programPath).replace("/", "\\")
+        program = shlex.quote(winProgPath) + " "
+    wrapperPath = directory / EXPORT_WRAPPER
+    with open(wrapperPath, "w") as wrapper:
+        wrapper.write(WRAPPER.format(version=VERSION,
+                                     locale=appConfig.locale,
+                                     registry=EXPORT_REGISTRY,
+                                     lang=shlex.quote(env["LANG"]),
+                                     winedebug=shlex.quote(env["WINEDEBUG"]),
+                                     program=program))
+    wrapperPath.chmod(0o755)
+    return registryPath, envPath, wrapperPath
+
+
+def export(argv=None):
+    "Entry point of the export subcommand."
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="winelocale export",
+        description="Write the registry patch, environment and a launch "
+        "wrapper for a locale to a directory, for applying to a Wine prefix "
+        "ahead of time. Needs neither Gtk nor Wine.")
+    parser.add_argument("directory", type=Path,
+                        help="directory to write the files to")
+    parser.add_argument("-l", "--locale", default="en_US",
+                        help="locale to export (default en_US)")
+    parser.add_argument("--exe", type=Path,
+                        help="program the wrapper runs; without it the "
+                        "wrapper passes its arguments to wine")
+    parser.add_argument("--config", type=Path,
+                        help="take the font settings from this config file "
+                        "instead of the defaults")
+    parser.add_argument("--font", metavar="NAME",
+                        help="font face name")
+    parser.add_argument("--font-size", type=float, metavar="POINTS",
+                        help="font size in points")
+    parser.add_argument("--font-weight", type=int, metavar="WEIGHT",
+                        help="font weight, e.g. %d for bold" % FW_BOLD)
+    parser.add_argument("--italic", action="store_true",
+                        help="use an italic font")
+    parser.add_argument("--hidpi", action="store_true",
+                        help="use 120dpi font and menubar heights")
+    parser.add_argument("--dpi", type=int, choices=SUPPORTED_DPI,
+                        help="LogPixels setting to patch")
+    parser.add_argument("--debug", metavar="CHANNELS",
+                        help="WINEDEBUG channels (default -all)")
+    args = parser.parse_args(argv)
+
+    if args.locale not in LOCALES and not isLocaleCode(args.locale):
+        print(f"unsupported locale {args.locale!r}", file=sys.stderr)
+        return 1
+    appConfig = Config()
+    if not isinstance(args.config, type(None)):
+        if not args.config.exists():
+            print(f"config file {args.config} does not exist",
                   file=sys.stderr)
-        else:
-            print("Child returned", compProc.returncode, file=sys.stderr)
-    except (OSError, subprocess.CalledProcessError) as e:
-        print("Execution failed:", e, file=sys.stderr)
-    return
+            return 1
+        appConfig.configFile = args.config
+        appConfig.updateConfigFromFile()
+    appConfig.locale = args.locale
+    appConfig.programPath = args.exe
+    appConfig.dpi = args.dpi
+    if args.hidpi:
+        appConfig.useHiDpiFont = True
+    if not isinstance(args.debug, type(None)):
+        appConfig.debugChannels = capture.normalizeChannels(args.debug)
+    changes = {}
+    if not isinstance(args.font, type(None)):
+        changes["lfFaceName"] = args.font
+    if not isinstance(args.font_size, type(None)):
+        changes["lfHeight"] = fontSize(args.font_size)
+    if not isinstance(args.font_weight, type(None)):
+        changes["lfWeight"] = args.font_weight
+    if args.italic:
+        changes["lfItalic"] = 1
+    appConfig.logFont = appConfig.logFont.replace(**changes)
+
+    try:
+        paths = writeExport(appConfig, args.directory)
+    except OSError as e:
+        print("Export failed:", e, file=sys.stderr)
+        return 1
+    for path in paths:
+        print(path)
+    return 0
+
+
+SUBCOMMANDS = {
+    "export": export,
+    "stats": history.stats,
+    "xvfb": xvfb.command,
+}
 
 
 def main():
     import argparse
 
-    appConfig = Config()
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        return SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
 
     parser = argparse.ArgumentParser(description=DESCRIP)
     parser.add_argument('--version', action='version',
@@ -962,21 +1376,89 @@ def main():
     parser.add_argument("-l", "--locale",
                         help="specify a locale in which to load"
                         " the target executable (ISO 3166 standard)")
+    parser.add_argument("--dpi", type=int, choices=SUPPORTED_DPI,
+                        help="LogPixels setting to patch, with font and "
+                        "menubar heights scaled to match (default 96, or "
+                        "120 with the 120dpi option)")
+    parser.add_argument("--debug", metavar="CHANNELS",
+                        help="enable Wine debug channels (e.g. +font,+reg) "
+                        "and capture the program output; the tail is saved "
+                        "if the program fails")
+    parser.add_argument("--capture-size", type=int, metavar="BYTES",
+                        help="bytes of output kept in memory with --debug "
+                        "(default %d)" % capture.CAPTURE_SIZE)
+    parser.add_argument("--spill", type=Path, metavar="PATH",
+                        help="also write the full --debug output to a gzip "
+                        "file, up to %d MiB uncompressed"
+                        % (capture.SPILL_LIMIT // (1024 * 1024)))
+    parser.add_argument("--supervise", action="store_true",
+                        help="keep the prefix patched and restart the "
+                        "program with a growing delay whenever it crashes")
+    parser.add_argument("--restarts", type=int, metavar="N",
+                        help="with --supervise, give up after N restarts "
+                        "within %d seconds (default %d)"
+                        % (supervisor.RESTART_WINDOW,
+                           supervisor.RESTART_BUDGET))
+    parser.add_argument("--xvfb", action="store_true",
+                        help="run on a display leased from a pool of warm "
+                        "Xvfb servers")
+    parser.add_argument("--xvfb-pool", type=int, metavar="N",
+                        help="with --xvfb, keep at most N servers "
+                        "(default %d)" % xvfb.POOL_SIZE)
+    parser.add_argument("--screenshot", type=Path, metavar="PATH",
+                        help="with --xvfb, save the screen to PATH in xwd "
+                        "format while the program runs")
+    parser.add_argument("--screenshot-after", type=float, metavar="SECONDS",
+                        help="with --screenshot, take it this long after "
+                        "the program started (default %g)"
+                        % xvfb.SCREENSHOT_DELAY)
+    parser.add_argument("--profile", type=Path, metavar="DIR",
+                        help="profile the launch with cProfile and "
+                        "tracemalloc and write the results to DIR")
     parser.add_argument("exe", type=Path, default=None,
                         help="target executable to run in wine with locale")
     args = parser.parse_args()
+    if not isinstance(args.capture_size, type(None)) and \
+       args.capture_size <= 0:
+        parser.error("--capture-size must be positive")
+    if not isinstance(args.xvfb_pool, type(None)) and args.xvfb_pool < 1:
+        parser.error("--xvfb-pool must be at least 1")
+    if not isinstance(args.screenshot_after, type(None)) and \
+       args.screenshot_after < 0:
+        parser.error("--screenshot-after must not be negative")
+    if not isinstance(args.restarts, type(None)) and args.restarts < 0:
+        parser.error("--restarts must not be negative")
+
+    if isinstance(args.profile, type(None)):
+        return run(args, history.PhaseTimer())
+
+    from winelocale import profiling
+    profile = profiling.Profile(args.profile)
+    profile.start()
+    try:
+        return run(args, profiling.ProfilingTimer(profile))
+    finally:
+        profile.stop()
 
-    appConfig.updateConfigFromFile()
-    appConfig.updateConfigFromArgs(args)
+
+def run(args, timer):
+    "Loads the settings and launches, showing the GUI if needed."
+    appConfig = Config()
+    with timer.phase("config"):
+        appConfig.updateConfigFromFile()
+        appConfig.updateConfigFromArgs(args)
 
     if not isinstance(args.locale, type(None)) and args.exe.exists():
         # dont show the GUI if the CLI has sufficient configuration
-        shellwine(appConfig)
+        try:
+            returncode = shellwine(appConfig, timer)
+        except (OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            return 1
+        recordLaunch(appConfig, timer, returncode)
     else:
-        win = WineLocaleWindow()
-        win.connect("destroy", Gtk.main_quit)
-        win.show_all()
-        Gtk.main()
+        from winelocale import gui
+        gui.run(appConfig, timer)
     return
 
 
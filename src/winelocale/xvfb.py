@@ -0,0 +1,353 @@
+'''
+-------------------------------------------------------------------------------
+Headless display pool
+
+`winelocale --xvfb ...` runs the program on a display leased from a pool of
+Xvfb servers instead of starting a fresh server per launch. Servers are
+started on first use, detached from winelocale, and kept running for the
+next launch.
+
+A lease is an exclusive flock() on display-N.lock in the pool directory, so
+any number of winelocale processes share the pool safely, and a lease held
+by a process that dies is returned by the kernel. The pool directory is per
+user, $XDG_RUNTIME_DIR/winelocale-xvfb or /tmp/winelocale-xvfb-UID, and must
+be private: the pid files in it decide which processes get signalled.
+
+A server is only used after a health check: its pid must be alive and its
+socket in /tmp/.X11-unix must accept a connection; otherwise it is replaced.
+Displays already used by some other X server are skipped.
+
+`winelocale xvfb` lists the pool and `winelocale xvfb --stop` stops the idle
+servers.
+-------------------------------------------------------------------------------
+'''
+
+import errno
+import fcntl
+import os
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+X11_SOCKET_DIR = Path("/tmp/.X11-unix")
+# Displays from here up, clear of the usual desktop and VNC displays
+FIRST_DISPLAY = 90
+POOL_SIZE = 4
+SCREEN = "1280x1024x24"
+START_TIMEOUT = 10.0
+LEASE_TIMEOUT = 300.0
+RETRY_INTERVAL = 0.2
+# Seconds after the program started until --screenshot is taken
+SCREENSHOT_DELAY = 5.0
+
+
+def poolDir():
+    "Returns the pool directory of the current user."
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "winelocale-xvfb"
+    return Path("/tmp/winelocale-xvfb-%d" % os.getuid())
+
+
+def makePrivateDir(path):
+    """Creates path with mode 0700, or checks that an existing one is.
+
+Raises PermissionError for a symlink, a non-directory or a directory of
+another user, as found when someone else created the path first."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a directory owned by this "
+                              f"user, refusing to use it")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+
+
+def openPrivate(path, flags, mode):
+    "Opens a pool file without following symlinks."
+    fd = os.open(path, flags | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+    return os.fdopen(fd, mode)
+
+
+def socketPath(number):
+    "Returns the X11 socket of a display number."
+    return X11_SOCKET_DIR / ("X%d" % number)
+
+
+def serverLockPid(number):
+    "Returns the pid in the X server's /tmp/.XN-lock, or None."
+    try:
+        return int(Path("/tmp/.X%d-lock" % number).read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def isAlive(pid):
+    "Checks that a process exists."
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def isAccepting(number, timeout=1.0):
+    "Checks that the display's socket accepts connections."
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(socketPath(number)))
+        except OSError:
+            return False
+    return True
+
+
+class Lease:
+    "An exclusively held display of the pool."
+    def __init__(self, pool, number, lockFile):
+        self.pool = pool
+        self.number = number
+        self.lockFile = lockFile
+
+    @property
+    def display(self):
+        "The DISPLAY value, e.g. \":90\"."
+        return ":%d" % self.number
+
+    def screenshot(self, path):
+        """Saves the whole screen to path in xwd format.
+
+Returns True on success; failures are reported but not raised, so a
+missing xwd never fails a launch."""
+        try:
+            subprocess.run(["xwd", "-root", "-silent", "-display",
+                            self.display, "-out", str(path)],
+                           check=True, timeout=30)
+        except (OSError, subprocess.SubprocessError) as e:
+            print("Unable to take a screenshot:", e, file=sys.stderr)
+            return False
+        return True
+
+    def scheduleScreenshot(self, path, delay=SCREENSHOT_DELAY):
+        """Takes a screenshot to path in delay seconds, from another thread.
+
+Returns the started threading.Timer; cancel it if the program exits first,
+since its windows would be gone by then."""
+        shot = threading.Timer(delay, self.screenshot, (path,))
+        shot.daemon = True
+        shot.start()
+        return shot
+
+    def release(self):
+        "Returns the display to the pool, leaving its server running."
+        if self.lockFile is not None:
+            self.lockFile.close()
+            self.lockFile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class DisplayPool:
+    """Up to size warm Xvfb servers on displays FIRST_DISPLAY and up."""
+    def __init__(self, size=POOL_SIZE, directory=None,
+                 first=FIRST_DISPLAY, screen=SCREEN):
+        if size < 1:
+            raise ValueError(f"the Xvfb pool needs at least one display, "
+                             f"not {size!r}")
+        self.size = size
+        self.directory = Path(poolDir() if directory is None else directory)
+        self.first = first
+        self.screen = screen
+
+    def numbers(self):
+        return range(self.first, self.first + self.size)
+
+    def lockPath(self, number):
+        return self.directory / ("display-%d.lock" % number)
+
+    def pidPath(self, number):
+        return self.directory / ("display-%d.pid" % number)
+
+    def serverPid(self, number):
+        "Returns the pid of the pool's server for a display, or None."
+        try:
+            with openPrivate(self.pidPath(number), os.O_RDONLY, "r") as pid:
+                return int(pid.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def isHealthy(self, number):
+        "Checks that the pool's server for a display is up and accepting."
+        pid = self.serverPid(number)
+        return pid is not None and isAlive(pid) and isAccepting(number)
+
+    def isForeign(self, number):
+        "Checks whether another X server, not ours, holds the display."
+        pid = serverLockPid(number)
+        return pid is not None and pid != self.serverPid(number) and \
+            isAlive(pid)
+
+    def _tryLock(self, number):
+        lockFile = openPrivate(self.lockPath(number),
+                               os.O_WRONLY | os.O_APPEND | os.O_CREAT, "a")
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            lockFile.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return None
+            raise
+        return lockFile
+
+    def lease(self, timeout=LEASE_TIMEOUT):
+        """Leases a display, starting its server if needed.
+
+Waits up to timeout seconds for a display to become free, then raises
+TimeoutError."""
+        makePrivateDir(self.directory)
+        deadline = time.monotonic() + timeout
+        while True:
+            for number in self.numbers():
+                lockFile = self._tryLock(number)
+                if lockFile is None:
+                    continue
+                try:
+                    if self.isHealthy(number):
+                        return Lease(self, number, lockFile)
+                    if self.isForeign(number):
+                        lockFile.close()
+                        continue
+                    self.start(number)
+                    return Lease(self, number, lockFile)
+                except BaseException:
+                    lockFile.close()
+                    raise
+            if time.monotonic() >= deadline:
+                raise TimeoutError("no display of the Xvfb pool became free "
+                                   "within %d seconds" % timeout)
+            time.sleep(RETRY_INTERVAL)
+
+    def start(self, number):
+        """Starts a detached Xvfb for a display; the caller holds its lock.
+
+A stale server of ours for the display is stopped first."""
+        self.stop(number)
+        with openPrivate(self.directory / ("display-%d.log" % number),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, "ab") as log:
+            process = subprocess.Popen(
+                ["Xvfb", ":%d" % number, "-screen", "0", self.screen,
+                 "-nolisten", "tcp"],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                start_new_session=True)
+        with openPrivate(self.pidPath(number),
+                         os.O_WRONLY | os.O_TRUNC | os.O_CREAT, "w") as pid:
+            pid.write("%d\n" % process.pid)
+        deadline = time.monotonic() + START_TIMEOUT
+        while not isAccepting(number):
+            if process.poll() is not None or time.monotonic() >= deadline:
+                self.stop(number)
+                raise OSError("Xvfb :%d did not start, see %s" % (
+                    number, self.directory / ("display-%d.log" % number)))
+            time.sleep(0.05)
+
+    def stop(self, number):
+        "Stops the pool's server for a display, if any."
+        pid = self.serverPid(number)
+        if pid is not None and isAlive(pid):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+            deadline = time.monotonic() + START_TIMEOUT
+            while isAlive(pid) and time.monotonic() < deadline:
+                try:
+                    os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    pass
+                time.sleep(0.05)
+        try:
+            self.pidPath(number).unlink()
+        except FileNotFoundError:
+            pass
+
+    def stopIdle(self):
+        "Stops every server that is not leased; returns their displays."
+        stopped = []
+        if not self.directory.exists():
+            return stopped
+        makePrivateDir(self.directory)
+        for number in self.numbers():
+            lockFile = self._tryLock(number)
+            if lockFile is None:
+                continue
+            with lockFile:
+                if self.serverPid(number) is not None:
+                    self.stop(number)
+                    stopped.append(number)
+        return stopped
+
+    def status(self):
+        "Returns (display, pid, healthy, leased) for every pool display."
+        rows = []
+        exists = self.directory.exists()
+        if exists:
+            makePrivateDir(self.directory)
+        for number in self.numbers():
+            leased = False
+            if exists:
+                lockFile = self._tryLock(number)
+                leased = lockFile is None
+                if lockFile is not None:
+                    lockFile.close()
+            rows.append((":%d" % number, self.serverPid(number),
+                         self.isHealthy(number), leased))
+        return rows
+
+
+def command(argv=None):
+    "Entry point of the xvfb subcommand."
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="winelocale xvfb",
+        description="Show the pool of warm Xvfb servers used by --xvfb, or "
+        "stop the idle ones.")
+    parser.add_argument("--pool", type=int, default=POOL_SIZE, metavar="N",
+                        help="pool size (default %d)" % POOL_SIZE)
+    parser.add_argument("--stop", action="store_true",
+                        help="stop every server that is not leased")
+    args = parser.parse_args(argv)
+    if args.pool < 1:
+        parser.error("--pool must be at least 1")
+
+    pool = DisplayPool(args.pool)
+    try:
+        if args.stop:
+            for number in pool.stopIdle():
+                print("stopped :%d" % number)
+            return 0
+        rows = pool.status()
+    except OSError as e:
+        print("Unable to use the Xvfb pool:", e, file=sys.stderr)
+        return 1
+    print("%-8s %8s %8s %7s" % ("display", "pid", "healthy", "leased"))
+    for display, pid, healthy, leased in rows:
+        print("%-8s %8s %8s %7s" % (display, pid or "-",
+                                    "yes" if healthy else "no",
+                                    "yes" if leased else "no"))
+    return 0
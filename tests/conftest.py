@@ -0,0 +1,4 @@
+def pytest_addoption(parser):
+    parser.addoption("--update-golden", action="store_true",
+                     help="rewrite tests/golden/ from the current registry "
+                     "encoder instead of checking it")
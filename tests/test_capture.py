@@ -0,0 +1,88 @@
+import gzip
+import os
+import sys
+
+import pytest
+
+from winelocale.capture import (RingBuffer, SpillFile, normalizeChannels,
+                               runCaptured)
+
+
+def test_keeps_everything_below_size():
+    ring = RingBuffer(8)
+    ring.write(b"abc")
+    ring.write(b"de")
+    assert ring.getvalue() == b"abcde"
+    assert ring.dropped == 0
+
+
+def test_wraps_around():
+    ring = RingBuffer(8)
+    ring.write(b"abcdef")
+    ring.write(b"ghijk")
+    assert ring.getvalue() == b"defghijk"
+    assert ring.dropped == 3
+
+
+def test_exactly_full():
+    ring = RingBuffer(4)
+    ring.write(b"ab")
+    ring.write(b"cd")
+    assert ring.getvalue() == b"abcd"
+    ring.write(b"e")
+    assert ring.getvalue() == b"bcde"
+
+
+def test_write_larger_than_size():
+    ring = RingBuffer(4)
+    ring.write(b"xy")
+    ring.write(b"0123456789")
+    assert ring.getvalue() == b"6789"
+    assert ring.dropped == 8
+    ring.write(b"ab")
+    assert ring.getvalue() == b"89ab"
+
+
+def test_many_small_writes():
+    ring = RingBuffer(7)
+    data = bytes(range(100))
+    for offset in range(0, len(data), 3):
+        ring.write(data[offset:offset + 3])
+    assert ring.getvalue() == data[-7:]
+    assert ring.total == len(data)
+
+
+@pytest.mark.parametrize("size", (0, -1))
+def test_rejects_non_positive_size(size):
+    with pytest.raises(ValueError):
+        RingBuffer(size)
+
+
+@pytest.mark.parametrize("channels, expected", (
+    ("font,reg", "+font,+reg"),
+    (" font , ,-all", "+font,-all"),
+    ("warn+heap", "warn+heap"),
+    ("", "")))
+def test_normalize_channels(channels, expected):
+    assert normalizeChannels(channels) == expected
+
+
+def test_run_captured_keeps_tail():
+    code = "import sys; sys.stdout.write('x' * 5000 + 'end'); sys.exit(2)"
+    returncode, ring = runCaptured([sys.executable, "-c", code], os.environ,
+                                   size=16)
+    assert returncode == 2
+    assert ring.getvalue() == b"x" * 13 + b"end"
+    assert ring.dropped == 4987
+
+
+def test_spill_file_limit(tmp_path):
+    path = tmp_path / "spill.gz"
+    spill = SpillFile(path, limit=10)
+    spill.write(b"0123456")
+    spill.write(b"789abc")
+    spill.write(b"def")
+    spill.close()
+    assert spill.truncated
+    with gzip.open(path) as data:
+        assert data.read().startswith(b"0123456789\n[winelocale: spill")
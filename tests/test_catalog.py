@@ -0,0 +1,110 @@
+import marshal
+import shutil
+import importlib.resources as resources
+
+import pytest
+
+from winelocale import catalog
+
+EN_US = """[dialogs]
+ok = OK
+cancel = Cancel
+
+[labels]
+locale = Locale
+"""
+PT_BR = """[dialogs]
+ok = Confirmar
+"""
+ES = """[labels]
+locale = Idioma
+"""
+SOURCE_DIR = resources.files("winelocale") / "i18n"
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    "Forgets the loaded catalog and strings, restoring them afterwards."
+    monkeypatch.setattr(catalog, "_catalog", None)
+    monkeypatch.setattr(catalog, "_strings", {})
+
+
+@pytest.fixture
+def synthetic(fresh, monkeypatch):
+    "Installs a catalog of en_US, pt_BR and es."
+    monkeypatch.setattr(catalog, "_catalog", marshal.loads(
+        catalog.compileCatalog([("en_US", EN_US), ("pt_BR", PT_BR),
+                                ("es", ES)])))
+
+
+@pytest.mark.parametrize("langCode, resolved", (
+    ("pt_BR", "pt_BR"),
+    ("pt_BR.UTF-8", "pt_BR"),
+    ("es_AR", "es"),
+    ("es_AR.UTF-8", "es"),
+    ("en_US.utf8", "en_US"),
+    ("de_DE.UTF-8", None),
+    ("C", None)))
+def test_resolve_lang_code(langCode, resolved):
+    assert catalog.resolveLangCode(
+        langCode, {"en_US": {}, "pt_BR": {}, "es": {}}) == resolved
+
+
+def test_unknown_language_uses_en_us(synthetic, capsys):
+    strings = catalog.loadStrings("de_DE.UTF-8")
+    assert strings.langCode == "en_US"
+    assert strings.get("dialogs", "ok") == "OK"
+    assert "de_DE.UTF-8" in capsys.readouterr().err
+    assert catalog.loadStrings("de_DE.UTF-8") is strings
+
+
+def test_missing_strings_fall_back_to_en_us(synthetic):
+    strings = catalog.loadStrings("pt_BR.UTF-8")
+    assert strings.get("dialogs", "ok") == "Confirmar"
+    assert strings.get("dialogs", "cancel") == "Cancel"
+    assert strings.get("labels", "locale") == "Locale"
+    assert strings.has_option("dialogs", "cancel")
+    assert not strings.has_option("dialogs", "nothing")
+    with pytest.raises(KeyError):
+        strings.get("dialogs", "nothing")
+    assert catalog.loadStrings("es_AR").get("labels", "locale") == "Idioma"
+
+
+def test_sections_decode_lazily(synthetic):
+    strings = catalog.loadStrings("en_US")
+    assert strings.decoded == {}
+    strings.get("labels", "locale")
+    assert list(strings.decoded) == ["labels"]
+
+
+def test_catalog_matches_lang_files(fresh):
+    # A source checkout has no catalog.bin, so this compiles the sources
+    loaded = catalog.loadCatalog()
+    sources = dict(catalog.sourceLangFiles(SOURCE_DIR))
+    assert sorted(loaded) == sorted(sources)
+    for langCode, text in sources.items():
+        sections = {section: marshal.loads(encoded)
+                    for section, encoded in loaded[langCode].items()}
+        assert sections == catalog.compileLang(text)
+
+
+def packageWith(tmp_path, catalogBytes):
+    "Copies the .lang files into a fake package with the given catalog."
+    i18nDir = tmp_path / "i18n"
+    shutil.copytree(SOURCE_DIR, i18nDir)
+    (i18nDir / catalog.CATALOG_FILENAME).write_bytes(catalogBytes)
+    return lambda package: tmp_path
+
+
+def test_compiled_catalog_is_read(fresh, tmp_path, monkeypatch):
+    compiled = catalog.compileCatalog([("en_US", EN_US)])
+    monkeypatch.setattr(catalog.resources, "files",
+                        packageWith(tmp_path, compiled))
+    assert catalog.loadCatalog() == marshal.loads(compiled)
+
+
+def test_corrupt_catalog_is_compiled_again(fresh, tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog.resources, "files",
+                        packageWith(tmp_path, b"\xffnot a catalog"))
+    assert sorted(catalog.loadCatalog()) == \
+        sorted(dict(catalog.sourceLangFiles(SOURCE_DIR)))
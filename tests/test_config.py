@@ -0,0 +1,82 @@
+import configparser
+
+import pytest
+
+from winelocale import winelocale as wl
+
+
+def savedConfig(path):
+    "A Config with non-default settings, written to path."
+    appConfig = wl.Config(configFile=path)
+    appConfig.locale = "ja_JP"
+    appConfig.logFont = wl.LogFont(lfHeight=10.5, lfWeight=wl.FW_BOLD,
+                                   lfItalic=1, lfFaceName="ＭＳ Ｐゴシック")
+    appConfig.haveFonts["Kochi Gothic"] = True
+    appConfig.haveFonts["UnDotum"] = True
+    appConfig.useSmoothing = True
+    appConfig.useHiDpiFont = False
+    appConfig.useShortcut = True
+    appConfig.updateConfigFile()
+    return appConfig
+
+
+def loaded(path):
+    appConfig = wl.Config(configFile=path)
+    appConfig.updateConfigFromFile()
+    return appConfig
+
+
+def settings(appConfig):
+    return (appConfig.locale, appConfig.logFont, appConfig.haveFonts,
+            appConfig.useSmoothing, appConfig.useHiDpiFont,
+            appConfig.useShortcut)
+
+
+def noConfigParser(*args, **kwargs):
+    raise AssertionError("the config file was parsed")
+
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    path = tmp_path / "winelocale.ini"
+    saved = savedConfig(path)
+    assert wl.configCachePath(path).exists()
+    monkeypatch.setattr(configparser, "ConfigParser", noConfigParser)
+    appConfig = loaded(path)
+    assert settings(appConfig) == settings(saved)
+    assert appConfig.logFont.lfHeight == 10.5
+    assert appConfig.logFont.lfQuality == wl.DEFAULT_QUALITY
+
+
+def test_cache_matches_config_file(tmp_path):
+    path = tmp_path / "winelocale.ini"
+    savedConfig(path)
+    wl.configCachePath(path).unlink()
+    parsed = loaded(path)
+    assert wl.configCachePath(path).exists()
+    assert settings(loaded(path)) == settings(parsed)
+
+
+def test_stale_cache_after_edit(tmp_path):
+    path = tmp_path / "winelocale.ini"
+    savedConfig(path)
+    path.write_text(path.read_text().replace("ja_JP", "ast_ES"))
+    appConfig = loaded(path)
+    assert appConfig.locale == "ast_ES"
+    assert appConfig.logFont.lfFaceName == "ＭＳ Ｐゴシック"
+
+
+@pytest.mark.parametrize("damage", (
+    lambda data: data[:len(data) // 2],
+    lambda data: data[:10],
+    lambda data: b"",
+    lambda data: b"XXXX" + data[4:],
+    lambda data: data + b"extra",
+    lambda data: data[:-2] + b"\xff\xff"))
+def test_bad_cache_falls_back(tmp_path, damage):
+    path = tmp_path / "winelocale.ini"
+    saved = savedConfig(path)
+    cachePath = wl.configCachePath(path)
+    cachePath.write_bytes(damage(cachePath.read_bytes()))
+    assert settings(loaded(path)) == settings(saved)
+    # The config file was parsed and the cache rewritten
+    assert cachePath.read_bytes()[:4] == wl.CONFIG_CACHE_MAGIC
@@ -0,0 +1,97 @@
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from winelocale import winelocale as wl
+
+STUB_WINE = """#!/bin/sh
+echo "LANG=$LANG"
+echo "WINEDEBUG=$WINEDEBUG"
+for arg in "$@"; do
+    echo "arg=$arg"
+done
+"""
+
+
+@pytest.fixture
+def stubWine(tmp_path, monkeypatch):
+    "Puts a wine on PATH that prints its environment and arguments."
+    binDir = tmp_path / "bin"
+    binDir.mkdir()
+    (binDir / "wine").write_text(STUB_WINE)
+    (binDir / "wine").chmod(0o755)
+    monkeypatch.setenv("PATH", str(binDir) + os.pathsep + os.environ["PATH"])
+
+
+def readEnv(path):
+    return dict(line.split("=", 1) for line in path.read_text().splitlines())
+
+
+def test_export(tmp_path, stubWine, capsys):
+    out = tmp_path / "out"
+    program = Path("/opt/My Games/game's.exe")
+    assert wl.export([str(out), "-l", "ja_JP", "--exe", str(program),
+                      "--font", "IPAGothic", "--font-size", "12",
+                      "--debug", "font,reg"]) == 0
+    registry, env, wrapper = (out / wl.EXPORT_REGISTRY, out / wl.EXPORT_ENV,
+                              out / wl.EXPORT_WRAPPER)
+    assert capsys.readouterr().out.split() == \
+        [str(registry), str(env), str(wrapper)]
+
+    with open(registry, encoding="utf-8", newline="") as patch:
+        assert patch.read() == wl.buildRegistry(
+            "ja_JP", wl.LogFont(lfHeight=12, lfFaceName="IPAGothic"))
+    assert readEnv(env) == {"LANG": "ja_JP.UTF-8",
+                            "WINEDEBUG": "+font,+reg"}
+
+    assert os.access(wrapper, os.X_OK)
+    subprocess.run(["sh", "-n", str(wrapper)], check=True)
+    output = subprocess.run([str(wrapper), "--arg with space"], check=True,
+                            capture_output=True, text=True).stdout
+    assert output.splitlines() == [
+        "LANG=ja_JP.UTF-8", "WINEDEBUG=+font,+reg",
+        "arg=Z:\\opt\\My Games\\game's.exe", "arg=--arg with space"]
+
+
+def test_export_without_program(tmp_path, stubWine):
+    out = tmp_path / "out"
+    assert wl.export([str(out)]) == 0
+    assert readEnv(out / wl.EXPORT_ENV) == {"LANG": "en_US.UTF-8",
+                                            "WINEDEBUG": "-all"}
+    output = subprocess.run([str(out / wl.EXPORT_WRAPPER), "setup.exe"],
+                            check=True, capture_output=True,
+                            text=True).stdout
+    assert output.splitlines()[2:] == ["arg=setup.exe"]
+
+
+def test_export_config(tmp_path):
+    configFile = tmp_path / "winelocale.ini"
+    appConfig = wl.Config(configFile=configFile)
+    appConfig.logFont = wl.LogFont(lfHeight=14, lfWeight=wl.FW_BOLD,
+                                   lfFaceName="Noto Sans")
+    appConfig.useHiDpiFont = True
+    appConfig.updateConfigFile()
+
+    out = tmp_path / "out"
+    assert wl.export([str(out), "-l", "de_DE", "--config", str(configFile),
+                      "--italic"]) == 0
+    expected = wl.buildRegistry(
+        "de_DE", wl.LogFont(lfHeight=14, lfWeight=wl.FW_BOLD, lfItalic=1,
+                            lfFaceName="Noto Sans"), useHiDpiFont=True)
+    with open(out / wl.EXPORT_REGISTRY, encoding="utf-8",
+              newline="") as patch:
+        assert patch.read() == expected
+
+
+def test_export_missing_config(tmp_path, capsys):
+    assert wl.export([str(tmp_path / "out"), "--config",
+                      str(tmp_path / "missing.ini")]) == 1
+    assert "does not exist" in capsys.readouterr().err
+    assert not (tmp_path / "out").exists()
+
+
+def test_export_unsupported_locale(tmp_path, capsys):
+    assert wl.export([str(tmp_path / "out"), "-l", "japanese"]) == 1
+    assert "unsupported locale" in capsys.readouterr().err
@@ -0,0 +1,141 @@
+import pytest
+
+from winelocale.history import (TOTAL, PhaseTimer, connect, findRegression,
+                                formatReport, loadSamples, percentile,
+                                recordLaunch, stats)
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0], 100) == 4.0
+    assert percentile([0.0, 10.0], 90) == pytest.approx(9.0)
+
+
+def test_no_regression_when_steady():
+    assert findRegression([1.0] * 30) is None
+
+
+def test_regression_of_recent_launches():
+    series = [1.0] * 20 + [2.0] * 3
+    assert findRegression(series) == (1.0, 2.0)
+
+
+def test_one_slow_launch_is_not_a_regression():
+    series = [1.0] * 20 + [1.0, 1.0, 5.0]
+    assert findRegression(series) is None
+
+
+def test_baseline_is_limited_to_window():
+    # Slow long ago, fast in the window, slow again now
+    series = [3.0] * 20 + [1.0] * 5 + [2.0] * 3
+    assert findRegression(series, window=5) == (1.0, 2.0)
+    assert findRegression(series, window=25) is None
+
+
+def test_too_few_launches():
+    assert findRegression([1.0] * 4 + [9.0] * 3) is None
+    assert findRegression([1.0] * 5 + [9.0] * 3) == (1.0, 9.0)
+
+
+def test_recent_one():
+    assert findRegression([1.0] * 10 + [4.0], recent=1) == (1.0, 4.0)
+
+
+@pytest.mark.parametrize("recent, window", ((0, 20), (3, 0), (-1, 20)))
+def test_rejects_empty_samples(recent, window):
+    with pytest.raises(ValueError):
+        findRegression([1.0] * 30, recent=recent, window=window)
+
+
+@pytest.fixture
+def database(tmp_path):
+    "A history with two launches of one program and one of another."
+    path = tmp_path / "history.sqlite"
+    # Launches are recorded under resolved paths, see winelocale.recordLaunch()
+    game = (tmp_path / "game.exe").resolve()
+    tool = (tmp_path / "tool.exe").resolve()
+    recordLaunch(game, "ja_JP", "/prefix", {
+        "config": 0.1, "regedit": 1.0, "runtime": 10.0, "firstframe": 0.5},
+        0, started=1.0, path=path)
+    recordLaunch(game, "ja_JP", "/prefix", {
+        "config": 0.2, "regedit": 2.0, "runtime": 20.0, "firstframe": 0.7},
+        1, started=2.0, path=path)
+    recordLaunch(tool, "de_DE", "/prefix", {"runtime": 3.0}, 0,
+                 started=3.0, path=path)
+    return path, game, tool
+
+
+def test_samples_per_program_and_locale(database):
+    path, game, tool = database
+    db = connect(path)
+    try:
+        samples = loadSamples(db)
+    finally:
+        db.close()
+    assert set(samples) == {(str(game), "ja_JP"), (str(tool), "de_DE")}
+    phases = samples[(str(game), "ja_JP")]
+    assert phases["runtime"] == [10.0, 20.0]
+    assert phases["firstframe"] == [0.5, 0.7]
+    # The first frame overlaps the phases and is not part of the total
+    assert phases[TOTAL] == pytest.approx([11.1, 22.2])
+    assert samples[(str(tool), "de_DE")][TOTAL] == [3.0]
+
+
+def test_samples_filtered(database):
+    path, game, tool = database
+    db = connect(path)
+    try:
+        assert set(loadSamples(db, exe=tool)) == {(str(tool), "de_DE")}
+        assert set(loadSamples(db, locale="ja_JP")) == \
+            {(str(game), "ja_JP")}
+        assert loadSamples(db, exe=game, locale="de_DE") == {}
+    finally:
+        db.close()
+
+
+def test_report(database):
+    path, game, tool = database
+    db = connect(path)
+    try:
+        report = formatReport(loadSamples(db))
+    finally:
+        db.close()
+    assert "%s [ja_JP]" % game in report
+    assert "REGRESSION" not in report
+    phases = [line.split()[0] for line in report.splitlines()
+              if line.startswith("  ") and "[" not in line]
+    assert phases[:6] == ["phase", "config", "regedit", "runtime",
+                          "firstframe", TOTAL]
+    assert formatReport({}) == "No launches recorded yet."
+
+
+def test_report_flags_regression():
+    samples = {("game.exe", "ja_JP"): {"runtime": [1.0] * 20 + [3.0] * 3}}
+    assert "REGRESSION runtime" in formatReport(samples)
+
+
+def test_stats_matches_resolved_exe(database, monkeypatch, capsys):
+    path, game, tool = database
+    monkeypatch.chdir(path.parent)
+    assert stats(["--db", str(path), "--exe", "tool.exe"]) == 0
+    report = capsys.readouterr().out
+    assert "%s [de_DE]" % tool in report
+    assert "game.exe" not in report
+
+
+@pytest.mark.parametrize("option", ("--recent", "--window"))
+def test_stats_rejects_empty_windows(option, tmp_path):
+    with pytest.raises(SystemExit):
+        stats(["--db", str(tmp_path / "history.sqlite"), option, "0"])
+
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    timer.add("regedit", 1.0)
+    with timer.phase("regedit"):
+        pass
+    timer.mark("firstframe")
+    assert timer.timings["regedit"] >= 1.0
+    assert set(timer.timings) == {"regedit", "firstframe"}
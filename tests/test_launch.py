@@ -0,0 +1,168 @@
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from winelocale import history, locales
+from winelocale import winelocale as wl
+
+# Logs every call, making the program itself take a while
+STUB_WINE = """#!/bin/sh
+printf 'start %s %s\n' "$WINEPREFIX" "$1" >> "$WINE_LOG"
+case "$1" in
+    regedit.exe) ;;
+    *) echo "LANG=$LANG WINEDEBUG=$WINEDEBUG"; sleep 0.5 ;;
+esac
+printf 'end %s %s\n' "$WINEPREFIX" "$1" >> "$WINE_LOG"
+case "$1" in
+    *fail.exe) exit 3 ;;
+esac
+"""
+
+
+@pytest.fixture
+def available(monkeypatch):
+    "Pretends every locale is generated on this host."
+    monkeypatch.setattr(locales, "isLocaleAvailable",
+                        lambda name, index=None: True)
+
+
+@pytest.fixture
+def stubWine(tmp_path, monkeypatch):
+    "Puts a logging wine on PATH; returns the log."
+    binDir = tmp_path / "bin"
+    binDir.mkdir()
+    (binDir / "wine").write_text(STUB_WINE)
+    (binDir / "wine").chmod(0o755)
+    monkeypatch.setenv("PATH", str(binDir) + os.pathsep + os.environ["PATH"])
+    log = tmp_path / "wine.log"
+    monkeypatch.setenv("WINE_LOG", str(log))
+    return log
+
+
+def test_spec_validation():
+    with pytest.raises(ValueError):
+        wl.LaunchSpec("/tmp/a.exe", locale="japanese")
+    with pytest.raises(ValueError):
+        wl.LaunchSpec("/tmp/a.exe", dpi=100)
+    for size in (0, -1):
+        with pytest.raises(ValueError):
+            wl.LaunchSpec("/tmp/a.exe", captureSize=size)
+    spec = wl.LaunchSpec("/tmp/a.exe", locale="ast_ES", dpi=144)
+    assert spec.programPath == Path("/tmp/a.exe")
+
+
+def test_spec_is_immutable():
+    env = {"HOME": "/home/a"}
+    logFont = {"lfHeight": 12, "lfFaceName": "Sans"}
+    spec = wl.LaunchSpec("/tmp/a.exe", env=env, logFont=logFont)
+    env["HOME"] = "/home/b"
+    logFont["lfHeight"] = 20
+    assert spec.env["HOME"] == "/home/a"
+    assert spec.logFont == wl.LogFont(lfHeight=12, lfFaceName="Sans")
+    with pytest.raises(TypeError):
+        spec.env["HOME"] = "/home/c"
+    with pytest.raises(AttributeError):
+        spec.locale = "de_DE"
+    with pytest.raises(AttributeError):
+        spec.logFont.lfHeight = 20
+
+
+def test_prepare_environments(available):
+    spec = wl.LaunchSpec("/opt/game/game.exe", locale="ja_JP",
+                         debugChannels="+font", display=":91",
+                         env={"HOME": "/home/a", "WINEDEBUG": "+all"})
+    prepared = wl.prepare(spec)
+    assert dict(prepared.env) == {"HOME": "/home/a", "WINEDEBUG": "-all",
+                                  "DISPLAY": ":91"}
+    assert dict(prepared.programEnv) == {
+        "HOME": "/home/a", "WINEDEBUG": "+font", "DISPLAY": ":91",
+        "LANG": "ja_JP.UTF-8"}
+    assert prepared.winProgPath == "Z:\\opt\\game\\game.exe"
+    assert prepared.prefix == "/home/a/.wine"
+    assert prepared.registry == wl.buildRegistry("ja_JP", wl.LogFont())
+    with pytest.raises(TypeError):
+        prepared.programEnv["LANG"] = "C"
+
+
+def test_prepare_defaults(available):
+    prepared = wl.prepare(wl.LaunchSpec("/tmp/a.exe", env={}))
+    assert prepared.env == {"WINEDEBUG": "-all"}
+    assert prepared.programEnv == {"WINEDEBUG": "-all",
+                                   "LANG": "en_US.UTF-8"}
+
+
+def test_prepare_missing_locale(monkeypatch):
+    monkeypatch.setattr(locales, "isLocaleAvailable",
+                        lambda name, index=None: False)
+    with pytest.raises(ValueError):
+        wl.prepare(wl.LaunchSpec("/tmp/a.exe", locale="ja_JP"))
+
+
+def launchAll(specs):
+    "Launches every spec from its own thread; returns their results."
+    results = [None] * len(specs)
+
+    def run(index):
+        timer = history.PhaseTimer()
+        results[index] = wl.launch(wl.prepare(specs[index], timer), timer)
+
+    threads = [threading.Thread(target=run, args=(index,))
+               for index in range(len(specs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def calls(log):
+    return [line.split() for line in log.read_text().splitlines()]
+
+
+def test_concurrent_launches(tmp_path, available, stubWine):
+    specs = [wl.LaunchSpec(tmp_path / ("%s.exe" % name), workDir=tmp_path,
+                           env=dict(os.environ,
+                                    WINEPREFIX=str(tmp_path / name)))
+             for name in ("one", "two", "fail")]
+    results = launchAll(specs)
+    assert [result.returncode for result in results] == [0, 0, 3]
+    for result in results:
+        assert set(result.timings) == {"patch", "regedit", "runtime"}
+    # Different prefixes run side by side
+    starts = [index for index, call in enumerate(calls(stubWine))
+              if call[0] == "start" and call[2].endswith(".exe")
+              and call[2] != "regedit.exe"]
+    assert len(starts) == 3
+    assert max(starts) < min(index for index, call
+                             in enumerate(calls(stubWine))
+                             if call[0] == "end" and call[2] != "regedit.exe")
+    assert not list(tmp_path.glob("winelocale-*.reg"))
+
+
+def test_launches_sharing_a_prefix_are_serialized(tmp_path, available,
+                                                  stubWine):
+    env = dict(os.environ, WINEPREFIX=str(tmp_path / "prefix"))
+    specs = [wl.LaunchSpec(tmp_path / ("%d.exe" % index), workDir=tmp_path,
+                           env=env)
+             for index in range(3)]
+    results = launchAll(specs)
+    assert [result.returncode for result in results] == [0, 0, 0]
+    log = calls(stubWine)
+    assert len(log) == 3 * 6
+    # Each launch patches, runs and restores before the next one starts
+    for offset in range(0, len(log), 6):
+        launchCalls = [call[2] for call in log[offset:offset + 6]]
+        assert launchCalls[0] == launchCalls[1] == "regedit.exe"
+        assert launchCalls[2] == launchCalls[3] != "regedit.exe"
+        assert launchCalls[4] == launchCalls[5] == "regedit.exe"
+
+
+def test_launch_captures_debug_output(tmp_path, available, stubWine):
+    spec = wl.LaunchSpec(tmp_path / "fail.exe", workDir=tmp_path,
+                         debugChannels="+font", captureSize=64)
+    result = wl.launch(wl.prepare(spec))
+    assert result.returncode == 3
+    assert result.tailPath.read_text() == \
+        "LANG=en_US.UTF-8 WINEDEBUG=+font\n"
@@ -0,0 +1,106 @@
+import pytest
+
+from winelocale import locales
+from winelocale.winelocale import (LOCALE_CHARSETS, LOCALE_FONTS, LOCALES,
+                                   Config, LaunchSpec, getLocaleList,
+                                   isLocaleCode)
+
+
+def writeArchive(path, names, magic=locales.ARCHIVE_MAGIC, empty=2):
+    "Writes a header, a name hash table with empty slots, then the names."
+    size = len(names) + empty
+    namehashOffset = locales.ARCHIVE_HEAD.size
+    nameOffset = namehashOffset + size * locales.ARCHIVE_NAMEHASH.size
+    table = b""
+    strings = b""
+    for slot in range(size):
+        if slot % 2 or not names:
+            table += locales.ARCHIVE_NAMEHASH.pack(0, 0, 0)
+            continue
+        name = names.pop(0).encode("ascii")
+        table += locales.ARCHIVE_NAMEHASH.pack(
+            hash(name) & 0xffffffff, nameOffset + len(strings), 1)
+        strings += name + b"\0"
+    path.write_bytes(locales.ARCHIVE_HEAD.pack(
+        magic, 1, namehashOffset, size - empty, size) + table + strings)
+
+
+def test_read_archive(tmp_path):
+    archive = tmp_path / "locale-archive"
+    writeArchive(archive, ["C.utf8", "en_US.utf8", "ja_JP.eucjp"])
+    assert locales.readLocaleArchive(archive) == \
+        {"C.utf8", "en_US.utf8", "ja_JP.eucjp"}
+
+
+def test_read_empty_archive(tmp_path):
+    archive = tmp_path / "locale-archive"
+    writeArchive(archive, [])
+    assert locales.readLocaleArchive(archive) == set()
+
+
+def test_read_archive_bad_magic(tmp_path):
+    archive = tmp_path / "locale-archive"
+    writeArchive(archive, ["en_US.utf8"], magic=0x12345678)
+    with pytest.raises(ValueError):
+        locales.readLocaleArchive(archive)
+
+
+def test_read_locale_dirs(tmp_path):
+    (tmp_path / "de_DE.utf8").mkdir()
+    (tmp_path / "de_DE.utf8" / "LC_CTYPE").write_bytes(b"")
+    (tmp_path / "incomplete").mkdir()
+    assert locales.readLocaleDirs([tmp_path, tmp_path / "missing"]) == \
+        {"de_DE.utf8"}
+
+
+@pytest.mark.parametrize("name, expected", (
+    ("en_US.UTF-8", "en_US.utf8"),
+    ("en_US.utf8", "en_US.utf8"),
+    ("ja_JP.EUC-JP", "ja_JP.eucjp"),
+    ("sr_RS.UTF-8@latin", "sr_RS.utf8@latin"),
+    ("de_DE@euro", "de_DE@euro"),
+    ("C", "C")))
+def test_normalize_locale(name, expected):
+    assert locales.normalizeLocale(name) == expected
+
+
+def test_cache_path_without_home(monkeypatch):
+    monkeypatch.delenv("XDG_CACHE_HOME", raising=False)
+    monkeypatch.delenv("HOME", raising=False)
+    assert locales.cachePath() is None
+
+
+def test_utf8_locales():
+    index = {"C.utf8", "en_US.utf8", "ast_ES.utf8", "de_DE.iso88591",
+             "sr_RS.utf8@latin"}
+    assert locales.utf8Locales(index) == {"en_US", "ast_ES"}
+
+
+@pytest.mark.parametrize("code, valid", (
+    ("ja_JP", True), ("ast_ES", True), ("fil_PH", True), ("ja_jp", False),
+    ("j_JP", False), ("abcd_EF", False), ("ja_JPN", False), ("jaJP", False),
+    ("é_FR", False)))
+def test_is_locale_code(code, valid):
+    assert isLocaleCode(code) is valid
+
+
+def test_locale_list(monkeypatch):
+    monkeypatch.setitem(LOCALE_FONTS, "ja_JP", lambda appConfig: False)
+    index = {"de_DE.utf8", "ast_ES.utf8", "ja_JP.utf8", "en_US.utf8",
+             "el_GR.utf8"}
+    localeList = getLocaleList(Config(), index)
+    assert localeList == [("English", "en_US.UTF-8", "en_US"),
+                          ("ast_ES", "ast_ES.UTF-8", "ast_ES"),
+                          ("Deutsch", "de_DE.UTF-8", "de_DE")]
+    # Every offered code can be launched
+    for title, env, code in localeList:
+        LaunchSpec("/tmp/program.exe", locale=code)
+
+
+def test_locale_list_without_en_us():
+    assert getLocaleList(Config(), {"de_DE.utf8"}) == \
+        [("Deutsch", "de_DE.UTF-8", "de_DE")]
+
+
+def test_every_locale_has_a_charset():
+    assert set(LOCALE_CHARSETS) == set(LOCALES)
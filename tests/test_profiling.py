@@ -0,0 +1,76 @@
+import time
+
+from winelocale.profiling import PausableClock, collapseStacks, frameName
+
+MAIN = ("app.py", 1, "main")
+WORK = ("app.py", 10, "work")
+HELPER = ("lib.py", 5, "helper")
+SLEEP = ("~", 0, "<built-in method time.sleep>")
+
+
+def test_frame_name():
+    assert frameName(("/src/app.py", 3, "main")) == "main (app.py:3)"
+    assert frameName(SLEEP) == "<built-in method time.sleep>"
+
+
+def test_collapse_chain():
+    stats = {
+        MAIN: (1, 1, 0.001, 0.006, {}),
+        WORK: (1, 1, 0.002, 0.005, {MAIN: (1, 1, 0.002, 0.005)}),
+        SLEEP: (1, 1, 0.003, 0.003, {WORK: (1, 1, 0.003, 0.003)}),
+    }
+    main = frameName(MAIN)
+    work = main + ";" + frameName(WORK)
+    assert collapseStacks(stats) == {
+        main: 1000,
+        work: 2000,
+        work + ";" + frameName(SLEEP): 3000,
+    }
+
+
+def test_collapse_splits_shared_callee():
+    # helper is called from main and from work, 1ms and 3ms of its 4ms
+    stats = {
+        MAIN: (1, 1, 0.0, 0.008, {}),
+        WORK: (1, 1, 0.001, 0.004, {MAIN: (1, 1, 0.001, 0.004)}),
+        HELPER: (2, 2, 0.004, 0.004, {MAIN: (1, 1, 0.001, 0.001),
+                                      WORK: (1, 1, 0.003, 0.003)}),
+    }
+    main = frameName(MAIN)
+    work = main + ";" + frameName(WORK)
+    assert collapseStacks(stats) == {
+        main + ";" + frameName(HELPER): 1000,
+        work: 1000,
+        work + ";" + frameName(HELPER): 3000,
+    }
+
+
+def test_collapse_stops_at_recursion():
+    stats = {
+        MAIN: (1, 1, 0.001, 0.003, {}),
+        WORK: (2, 1, 0.002, 0.002, {MAIN: (1, 1, 0.001, 0.002),
+                                    WORK: (1, 1, 0.001, 0.001)}),
+    }
+    main = frameName(MAIN)
+    assert collapseStacks(stats) == {
+        main: 1000,
+        main + ";" + frameName(WORK): 2000,
+    }
+
+
+def test_pausable_clock_excludes_pauses():
+    clock = PausableClock()
+    start = clock()
+    clock.pause()
+    paused = clock()
+    time.sleep(0.05)
+    assert clock() == paused
+    # Nested pauses only resume with the outermost one
+    clock.pause()
+    clock.resume()
+    time.sleep(0.02)
+    assert clock() == paused
+    clock.resume()
+    assert clock() - start < 0.04
+    time.sleep(0.01)
+    assert clock() > paused
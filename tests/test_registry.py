@@ -0,0 +1,297 @@
+'''
+-------------------------------------------------------------------------------
+Registry encoder tests
+
+Guards buildRegistry(), generateRegistry() and getBinaryLogFont() against
+silent changes to the bytes they write into the hive:
+
+  golden        every case of goldenCases() is compared with the REGEDIT4
+                file kept for it in golden/, byte for byte
+  differential  seeded random settings are encoded both by buildRegistry()
+                and by the deliberately plain reference encoder below, and
+                the results compared byte for byte
+
+When an output change is intended, `python -m pytest --update-golden`
+rewrites the golden files, and the diff of tests/golden/ shows exactly what
+changed.
+-------------------------------------------------------------------------------
+'''
+
+import os
+import random
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from winelocale import metrics
+from winelocale import winelocale as wl
+
+GOLDEN_DIR = Path(__file__).resolve().parent / "golden"
+ITERATIONS = 500
+SEEDS = (0, 1, 2, 3)
+
+LONG_FACE = "Bitstream Vera Sans Mono Oblique Condensed"
+NONASCII_FACE = "ＭＳ Ｐゴシック"
+LONG_NONASCII_FACE = "文泉驛等寬微米黑 WenQuanYi Zen Hei Mono Medium"
+# The 31st UTF-16 code unit is the first half of a surrogate pair
+ASTRAL_FACE = "A" * 30 + "\U0001d400 Math"
+
+
+def goldenCases():
+    """Returns {name: buildRegistry() keyword arguments} for the corpus.
+
+Covers every LOCALES entry, every GTKTABLE_96 size at 96 and 120dpi, bold
+and italic, long and non-ASCII face names, and the other LogPixels."""
+    cases = {}
+    for locale in sorted(wl.LOCALES):
+        cases["locale-" + locale] = dict(locale=locale,
+                                         logFont=wl.LogFont())
+    for size in sorted(metrics.GTKTABLE_96):
+        for useHiDpiFont in (False, True):
+            name = "size-%d-%ddpi" % (size, wl.getDpi(useHiDpiFont))
+            cases[name] = dict(locale="ja_JP",
+                               logFont=wl.LogFont(lfHeight=size),
+                               useHiDpiFont=useHiDpiFont)
+    for weight in (wl.FW_NORMAL, wl.FW_BOLD):
+        for italic in (0, 1):
+            name = "weight-%d%s" % (weight, "-italic" if italic else "")
+            cases[name] = dict(locale="de_DE",
+                               logFont=wl.LogFont(lfWeight=weight,
+                                                  lfItalic=italic))
+    for name, face in (("long", LONG_FACE), ("nonascii", NONASCII_FACE),
+                       ("long-nonascii", LONG_NONASCII_FACE),
+                       ("astral", ASTRAL_FACE)):
+        for useHiDpiFont in (False, True):
+            cases["face-%s-%ddpi" % (name, wl.getDpi(useHiDpiFont))] = \
+                dict(locale="zh_TW", logFont=wl.LogFont(lfFaceName=face),
+                     useHiDpiFont=useHiDpiFont)
+    for dpi in wl.SUPPORTED_DPI:
+        if dpi not in (wl.getDpi(False), wl.getDpi(True)):
+            cases["dpi-%d" % dpi] = dict(locale="ko_KR",
+                                         logFont=wl.LogFont(lfHeight=11),
+                                         dpi=dpi)
+    return cases
+
+
+'''
+-------------------------------------------------------------------------------
+Reference encoder
+
+Written straight from the LOGFONTW layout and the REGEDIT4 format, sharing
+only the registry text constants with winelocale.py. Keep it simple rather
+than fast: it is what the real encoder is measured against.
+-------------------------------------------------------------------------------
+'''
+
+
+def referenceInt(value, size, signed):
+    "Little endian bytes of an integer field."
+    return int(value).to_bytes(size, "little", signed=signed)
+
+
+def referenceFaceName(faceName):
+    "lfFaceName: up to 31 UTF-16 code units, then zeroes up to 32 units."
+    units = []
+    for char in faceName:
+        codepoint = ord(char)
+        if codepoint > 0xffff:
+            codepoint -= 0x10000
+            units.append(0xd800 + (codepoint >> 10))
+            units.append(0xdc00 + (codepoint & 0x3ff))
+        else:
+            units.append(codepoint)
+    units = units[0:wl.LF_FACESIZE - 1]
+    units += [0] * (wl.LF_FACESIZE - len(units))
+    return b"".join(referenceInt(unit, 2, False) for unit in units)
+
+
+def referenceLogFont(locale, logFont, dpi):
+    "The hex: registry value of a LOGFONTW, see getBinaryLogFont()."
+    step = int(float(logFont.lfHeight) * metrics.METRIC_STEPS + 0.5)
+    height = metrics.modelMetrics(step / metrics.METRIC_STEPS, dpi)[0]
+    charSet = wl.LOCALE_CHARSETS.get(locale, logFont.lfCharSet)
+    data = b"".join((
+        referenceInt(-height, 4, True),
+        referenceInt(logFont.lfWidth, 4, True),
+        referenceInt(logFont.lfEscapement, 4, True),
+        referenceInt(logFont.lfOrientation, 4, True),
+        referenceInt(logFont.lfWeight, 4, True),
+        referenceInt(logFont.lfItalic, 1, False),
+        referenceInt(logFont.lfUnderline, 1, False),
+        referenceInt(logFont.lfStrikeOut, 1, False),
+        referenceInt(charSet, 1, False),
+        referenceInt(logFont.lfOutPrecision, 1, False),
+        referenceInt(logFont.lfClipPrecision, 1, False),
+        referenceInt(logFont.lfQuality, 1, False),
+        referenceInt(logFont.lfPitchAndFamily, 1, False),
+        referenceFaceName(logFont.lfFaceName)))
+    return "hex:" + ",".join("%02x" % byte for byte in data)
+
+
+def referenceRegistry(locale, logFont, useHiDpiFont=False, dpi=None):
+    "The REGEDIT4 patch buildRegistry() should produce."
+    if dpi is None:
+        dpi = 120 if useHiDpiFont else 96
+    step = int(float(logFont.lfHeight) * metrics.METRIC_STEPS + 0.5)
+    menuHeight = metrics.modelMetrics(step / metrics.METRIC_STEPS, dpi)[1]
+    value = referenceLogFont(locale, logFont, dpi)
+    text = wl.REGEDIT + wl.REG_FONTLINK + wl.REG_FONTSUBS
+    text += wl.REG_PATCHDLG[wl.LOCALE_PATCHDLG.get(locale, "ANSI")]
+    for name in ("CaptionFont", "MenuFont", "MessageFont", "SmCaptionFont",
+                 "StatusFont"):
+        text += wl.REG_METRICS[name] + value + "\n\n"
+    text += wl.REG_MENUH + '"%d"\n\n' % menuHeight
+    text += wl.REG_MENUW + '"%d"\n\n' % menuHeight
+    if dpi == 120:
+        text += wl.REG_SET120DPI
+    elif dpi == 96:
+        text += wl.REG_SET96DPI
+    else:
+        text += wl.REG_SETDPI % dpi
+    return text
+
+
+'''
+-------------------------------------------------------------------------------
+Checks
+-------------------------------------------------------------------------------
+'''
+
+
+def firstDifference(expected, actual):
+    "Describes where two strings first differ."
+    for offset, (left, right) in enumerate(zip(expected, actual)):
+        if left != right:
+            break
+    else:
+        offset = min(len(expected), len(actual))
+    line = expected.count("\n", 0, offset) + 1
+    return "first difference at offset %d (line %d): expected %r, got %r" % (
+        offset, line, expected[offset:offset + 24],
+        actual[offset:offset + 24])
+
+
+def generated(kwargs):
+    "Returns what generateRegistry() writes for a case."
+    appConfig = wl.Config(locale=kwargs["locale"], logFont=kwargs["logFont"],
+                          useHiDpiFont=kwargs.get("useHiDpiFont", False),
+                          dpi=kwargs.get("dpi"))
+    fd, path = tempfile.mkstemp(prefix="winelocale-", suffix=".reg")
+    os.close(fd)
+    try:
+        wl.generateRegistry(appConfig, path)
+        with open(path, encoding="utf-8", newline="") as registry:
+            return registry.read()
+    finally:
+        os.unlink(path)
+
+
+def randomFaceName(rng):
+    "A face name of 0 to 40 characters, mixing ASCII, CJK and astral ones."
+    alphabets = ("abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                 "ゴシック明朝體宋黑맑은고딕ＭＳＰ", "\U0001d400\U0001f600\U00020000")
+    return "".join(rng.choice(rng.choice(alphabets))
+                   for _ in range(rng.randint(0, 40)))
+
+
+def randomCase(rng):
+    "Random buildRegistry() arguments, within what the GUI can produce."
+    locale = rng.choice(sorted(wl.LOCALES) + ["xx_XX"])
+    size = rng.choice((rng.randint(1, metrics.MAX_SIZE),
+                       rng.randint(1, metrics.MAX_SIZE * 4) / 4,
+                       rng.uniform(0.5, metrics.MAX_SIZE + 32)))
+    logFont = wl.LogFont(
+        lfHeight=size,
+        lfWeight=rng.choice(range(wl.FW_THIN, wl.FW_HEAVY + 1, 100)),
+        lfItalic=rng.randint(0, 1),
+        lfUnderline=rng.randint(0, 1),
+        lfStrikeOut=rng.randint(0, 1),
+        lfCharSet=rng.randint(0, 255),
+        lfQuality=rng.randint(0, wl.CLEARTYPE_QUALITY),
+        lfPitchAndFamily=rng.randint(0, 255),
+        lfFaceName=randomFaceName(rng))
+    dpi = rng.choice((None,) + wl.SUPPORTED_DPI)
+    return dict(locale=locale, logFont=logFont,
+                useHiDpiFont=rng.random() < 0.5, dpi=dpi)
+
+
+def roundTrips(logFont):
+    """Checks that unpack() restores everything pack() kept.
+
+Only the face name may come back shorter, cut to 31 UTF-16 code units."""
+    packed = logFont.pack()
+    unpacked = wl.LogFont.unpack(packed)
+    units = logFont.lfFaceName.encode("utf-16-le", "surrogatepass")
+    return unpacked.pack() == packed and \
+        unpacked.lfFaceName.encode("utf-16-le", "surrogatepass") == \
+        units[0:(wl.LF_FACESIZE - 1) * 2] and \
+        unpacked.replace(lfFaceName=logFont.lfFaceName) == \
+        logFont.replace(lfHeight=int(logFont.lfHeight))
+
+
+'''
+-------------------------------------------------------------------------------
+Tests
+-------------------------------------------------------------------------------
+'''
+
+
+@pytest.fixture(scope="module")
+def updateGolden(request):
+    "Rewrites the corpus instead of checking it, see conftest.py."
+    if not request.config.getoption("--update-golden"):
+        return False
+    GOLDEN_DIR.mkdir(parents=True, exist_ok=True)
+    for stale in GOLDEN_DIR.glob("*.reg"):
+        if stale.stem not in goldenCases():
+            stale.unlink()
+    return True
+
+
+@pytest.mark.parametrize("name", sorted(goldenCases()))
+def test_golden(name, updateGolden):
+    kwargs = goldenCases()[name]
+    path = GOLDEN_DIR / (name + ".reg")
+    actual = wl.buildRegistry(**kwargs)
+    if updateGolden:
+        with open(path, "w", encoding="utf-8", newline="") as golden:
+            golden.write(actual)
+        return
+    with open(path, encoding="utf-8", newline="") as golden:
+        expected = golden.read()
+    assert actual == expected, \
+        "buildRegistry() " + firstDifference(expected, actual)
+    actual = generated(kwargs)
+    assert actual == expected, \
+        "generateRegistry() " + firstDifference(expected, actual)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_differential(seed):
+    rng = random.Random(seed)
+    for iteration in range(ITERATIONS):
+        kwargs = randomCase(rng)
+        expected = referenceRegistry(**kwargs)
+        actual = wl.buildRegistry(**kwargs)
+        assert actual == expected, "case %d %r: %s" % (
+            iteration, kwargs, firstDifference(expected, actual))
+        logFont = kwargs["logFont"]
+        if not float(logFont.lfHeight).is_integer():
+            with pytest.raises(ValueError):
+                logFont.pack()
+        else:
+            assert roundTrips(logFont), \
+                "case %d %r: LogFont.unpack() does not round trip" % (
+                    iteration, logFont)
+
+
+def test_pack_rejects_fractional_height():
+    with pytest.raises(ValueError):
+        wl.LogFont(lfHeight=10.5).pack()
+    assert roundTrips(wl.LogFont(lfHeight=10.0))
+
+
+def test_astral_face_is_cut_before_the_pair():
+    unpacked = wl.LogFont.unpack(wl.LogFont(lfFaceName=ASTRAL_FACE).pack())
+    assert unpacked.lfFaceName.startswith("A" * 30)
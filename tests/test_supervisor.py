@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from winelocale import supervisor, winelocale
+from winelocale.capture import RingBuffer
+from winelocale.supervisor import RestartPolicy, Supervisor, backoffDelay
+
+
+def test_backoff_delay():
+    assert backoffDelay(0) == 0.0
+    assert [backoffDelay(n, 1.0, 10.0) for n in range(1, 7)] == \
+        [1.0, 2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_policy_budget():
+    policy = RestartPolicy(budget=2, window=100.0, initial=1.0, maximum=60.0)
+    assert policy.crashed(0.0, 1.0) == 1.0
+    policy.restarted(1.0)
+    assert policy.crashed(2.0, 1.0) == 2.0
+    policy.restarted(4.0)
+    assert policy.crashed(5.0, 1.0) is None
+
+
+def test_policy_window_expires():
+    policy = RestartPolicy(budget=1, window=10.0)
+    assert policy.crashed(0.0, 1.0) is not None
+    policy.restarted(0.0)
+    assert policy.crashed(5.0, 1.0) is None
+    assert policy.crashed(11.0, 1.0) is not None
+
+
+def test_policy_stable_run_resets_backoff():
+    policy = RestartPolicy(budget=10, initial=1.0)
+    for now in range(3):
+        policy.crashed(float(now), 1.0)
+        policy.restarted(float(now))
+    assert policy.failures == 3
+    assert policy.crashed(100.0, supervisor.STABLE_SECONDS) == 1.0
+
+
+def child(code):
+    return [sys.executable, "-c", code]
+
+
+def test_clean_exit_is_not_restarted():
+    watcher = Supervisor(budget=3, initial=0.01)
+    assert watcher.run(child("pass"), os.environ) == 0
+    assert watcher.crashes == 0
+
+
+def test_gives_up_after_budget(capsys):
+    ring = RingBuffer(4096)
+    watcher = Supervisor(budget=2, initial=0.01, maximum=0.01)
+    code = child("import sys; print('crash'); sys.exit(3)")
+    assert watcher.run(code, os.environ, [ring]) == 3
+    assert watcher.crashes == 3
+    output = ring.getvalue()
+    assert output.count(b"crash\n") == 3
+    assert output.count(b"restarting]") == 2
+    assert "giving up" in capsys.readouterr().err
+
+
+def test_stop_before_run():
+    watcher = Supervisor()
+    watcher.stop()
+    assert watcher.run(child("raise SystemExit(3)"), os.environ) is None
+
+
+def test_stop_from_another_thread():
+    watcher = Supervisor()
+    ring = RingBuffer(4096)
+    timer = threading.Timer(0.5, watcher.stop)
+    timer.start()
+    try:
+        returncode = watcher.run(
+            child("import time; print('up', flush=True); time.sleep(60)"),
+            os.environ, [ring])
+    finally:
+        timer.cancel()
+    assert returncode != 0
+    assert ring.getvalue().startswith(b"up")
+    watcher.stop()
+
+
+def test_policy_rejects_negative_budget():
+    with pytest.raises(ValueError):
+        RestartPolicy(budget=-1)
+
+
+def test_zero_budget_never_restarts():
+    watcher = Supervisor(budget=0)
+    assert watcher.run(child("raise SystemExit(3)"), os.environ) == 3
+    assert watcher.crashes == 1
+
+
+def test_cli_rejects_negative_restarts(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["winelocale", "--supervise",
+                                      "--restarts", "-1", "program.exe"])
+    with pytest.raises(SystemExit):
+        winelocale.main()
+    assert "--restarts must not be negative" in capsys.readouterr().err
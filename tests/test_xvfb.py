@@ -0,0 +1,91 @@
+import os
+import stat
+
+import pytest
+
+from winelocale import xvfb
+
+# Far above any display a test machine would be using
+FIRST = 590
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    "A pool of two displays whose servers are never really started."
+    started = []
+    monkeypatch.setattr(xvfb, "RETRY_INTERVAL", 0.01)
+    monkeypatch.setattr(xvfb.DisplayPool, "start",
+                        lambda self, number: started.append(number))
+    pool = xvfb.DisplayPool(2, tmp_path / "pool", first=FIRST)
+    pool.started = started
+    return pool
+
+
+def test_leases_distinct_displays(pool):
+    with pool.lease(timeout=0) as first, pool.lease(timeout=0) as second:
+        assert {first.display, second.display} == \
+            {":%d" % FIRST, ":%d" % (FIRST + 1)}
+        assert sorted(pool.started) == [FIRST, FIRST + 1]
+        assert [row[3] for row in pool.status()] == [True, True]
+
+
+def test_full_pool_times_out(pool):
+    with pool.lease(timeout=0), pool.lease(timeout=0):
+        with pytest.raises(TimeoutError):
+            pool.lease(timeout=0.1)
+
+
+def test_release_frees_display(pool):
+    first = pool.lease(timeout=0)
+    second = pool.lease(timeout=0)
+    number = first.number
+    first.release()
+    first.release()
+    third = pool.lease(timeout=0)
+    assert third.number == number
+    third.release()
+    second.release()
+    assert [row[3] for row in pool.status()] == [False, False]
+
+
+def test_pool_directory_is_private(pool):
+    with pool.lease(timeout=0):
+        info = os.lstat(pool.directory)
+    assert stat.S_IMODE(info.st_mode) == 0o700
+    assert info.st_uid == os.getuid()
+
+
+def test_refuses_symlinked_directory(tmp_path):
+    (tmp_path / "elsewhere").mkdir()
+    (tmp_path / "pool").symlink_to(tmp_path / "elsewhere")
+    with pytest.raises(PermissionError):
+        xvfb.makePrivateDir(tmp_path / "pool")
+
+
+def test_tightens_own_directory(tmp_path):
+    (tmp_path / "pool").mkdir(mode=0o755)
+    xvfb.makePrivateDir(tmp_path / "pool")
+    assert stat.S_IMODE(os.lstat(tmp_path / "pool").st_mode) == 0o700
+
+
+def test_refuses_symlinked_files(pool, tmp_path):
+    xvfb.makePrivateDir(pool.directory)
+    target = tmp_path / "target"
+    target.write_text("%d\n" % os.getpid())
+    pool.lockPath(FIRST).symlink_to(target)
+    pool.pidPath(FIRST + 1).symlink_to(target)
+    with pytest.raises(OSError):
+        pool.lease(timeout=0)
+    assert pool.serverPid(FIRST + 1) is None
+
+
+def test_pool_dir_is_per_user(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert xvfb.poolDir() == tmp_path / "winelocale-xvfb"
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert xvfb.poolDir().name == "winelocale-xvfb-%d" % os.getuid()
+
+
+def test_pool_needs_a_display():
+    with pytest.raises(ValueError):
+        xvfb.DisplayPool(0)